@@ -0,0 +1,161 @@
+"""
+Deterministic synthetic inputs for the worker benchmarks.
+
+Audio is a click track at a known BPM laid over tone sections of different
+lengths, so beat tracking and section detection have real structure to find.
+Video is a plain background with a face-like ellipse (eyes and a mouth that
+opens and closes) drifting around the frame, so ROI and face detection code
+has a moving target.
+
+Everything is generated from fixed parameters and a seeded RNG, and written
+once per parameter set into a cache directory.
+
+Depends on: numpy, opencv-python
+"""
+
+import os
+import wave
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_SR = 22050
+
+# (relative length, tone frequency in Hz) — cycled to fill the requested duration
+SECTION_PATTERN: Sequence[Tuple[float, float]] = (
+    (1.0, 220.0),   # intro
+    (2.0, 330.0),   # verse
+    (1.5, 440.0),   # chorus
+    (2.0, 330.0),   # verse
+    (1.5, 440.0),   # chorus
+    (0.75, 550.0),  # bridge
+    (1.0, 220.0),   # outro
+)
+
+
+def click_track(
+    duration: float,
+    bpm: float = 120.0,
+    sr: int = DEFAULT_SR,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Mono float32 click track with tone sections underneath.
+
+    Clicks are 10 ms decaying noise bursts on every beat, accented on the
+    downbeat. Section lengths follow SECTION_PATTERN scaled to ``duration``.
+    """
+    rng = np.random.default_rng(seed)
+    num_samples = int(duration * sr)
+    t = np.arange(num_samples) / sr
+    y = np.zeros(num_samples, dtype=np.float32)
+
+    # Tone sections
+    scale = duration / sum(length for length, _ in SECTION_PATTERN)
+    start = 0
+    for length, freq in SECTION_PATTERN:
+        end = min(num_samples, start + int(length * scale * sr))
+        y[start:end] += 0.2 * np.sin(2 * np.pi * freq * t[start:end]).astype(np.float32)
+        start = end
+    y[start:] += 0.2 * np.sin(2 * np.pi * SECTION_PATTERN[-1][1] * t[start:]).astype(np.float32)
+
+    # Clicks
+    click_len = int(0.01 * sr)
+    envelope = np.exp(-np.linspace(0, 8, click_len)).astype(np.float32)
+    beat_interval = 60.0 / bpm
+    for beat, beat_time in enumerate(np.arange(0, duration, beat_interval)):
+        i = int(beat_time * sr)
+        n = min(click_len, num_samples - i)
+        gain = 0.9 if beat % 4 == 0 else 0.6
+        y[i:i + n] += gain * envelope[:n] * rng.uniform(-1, 1, n).astype(np.float32)
+
+    return np.clip(y, -1.0, 1.0)
+
+
+def write_wav(path: str, y: np.ndarray, sr: int = DEFAULT_SR):
+    """Write mono float audio as 16-bit PCM"""
+    pcm = (np.clip(y, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes(pcm.tobytes())
+
+
+def audio_fixture(cache_dir: str, duration: float, bpm: float = 120.0, sr: int = DEFAULT_SR) -> str:
+    """Path to a cached click-track WAV, generating it on first use"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"click_{bpm:g}bpm_{duration:g}s_{sr}.wav")
+    if not os.path.exists(path):
+        write_wav(path, click_track(duration, bpm=bpm, sr=sr), sr)
+    return path
+
+
+def face_frame(
+    index: int,
+    fps: float,
+    width: int,
+    height: int,
+) -> np.ndarray:
+    """
+    One BGR frame with a face-like ellipse on a Lissajous path. The mouth
+    opens and closes at about 4 Hz.
+    """
+    import cv2
+
+    frame = np.full((height, width, 3), (60, 70, 80), dtype=np.uint8)
+    t = index / fps
+
+    face_w, face_h = int(width * 0.18), int(height * 0.32)
+    cx = int(width / 2 + width * 0.25 * np.sin(2 * np.pi * 0.2 * t))
+    cy = int(height / 2 + height * 0.15 * np.sin(2 * np.pi * 0.3 * t + 1.0))
+
+    cv2.ellipse(frame, (cx, cy), (face_w // 2, face_h // 2), 0, 0, 360, (150, 180, 225), -1)
+    eye_dx, eye_y = face_w // 5, cy - face_h // 8
+    for ex in (cx - eye_dx, cx + eye_dx):
+        cv2.ellipse(frame, (ex, eye_y), (face_w // 12, face_h // 24), 0, 0, 360, (40, 40, 40), -1)
+
+    mouth_open = 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * t)
+    mouth_h = max(1, int(face_h * 0.02 + face_h * 0.08 * mouth_open))
+    cv2.ellipse(frame, (cx, cy + face_h // 4), (face_w // 5, mouth_h), 0, 0, 360, (50, 40, 120), -1)
+    return frame
+
+
+def video_fixture(
+    cache_dir: str,
+    duration: float,
+    width: int,
+    height: int,
+    fps: float = 24.0,
+) -> str:
+    """Path to a cached synthetic face video (mp4v), generating it on first use"""
+    import cv2
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"face_{width}x{height}_{fps:g}fps_{duration:g}s.mp4")
+    if os.path.exists(path):
+        return path
+
+    partial = path + ".part.mp4"
+    writer = cv2.VideoWriter(partial, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for {partial}")
+    for index in range(int(duration * fps)):
+        writer.write(face_frame(index, fps, width, height))
+    writer.release()
+    os.replace(partial, path)
+    return path
+
+
+def phoneme_track(duration: float, rate: float = 6.0) -> List[Dict[str, float]]:
+    """Alternating vowel/consonant phonemes at ``rate`` per second"""
+    symbols = ["a", "m", "o", "s", "e", "t", "i", "n", "u", "k"]
+    step = 1.0 / rate
+    return [
+        {
+            "phoneme": symbols[i % len(symbols)],
+            "start_time": i * step,
+            "end_time": (i + 1) * step,
+        }
+        for i in range(int(duration * rate))
+    ]
@@ -0,0 +1,308 @@
+"""
+Worker benchmark suite.
+
+Benchmarks the CPU-heavy worker entry points on deterministic synthetic
+inputs (see fixtures.py) across input sizes, reports throughput and peak
+memory, and fails when a result regresses against the stored baseline.
+
+    cd packages/workers
+    python -m benchmarks.run                       # all benchmarks, all sizes
+    python -m benchmarks.run --only analyze_audio --sizes small,medium
+    python -m benchmarks.run --update-baseline     # record baseline.json
+    python -m benchmarks.run --allow-missing-baseline  # report only, no gating
+
+Throughput is units per second of the median run (audio samples or video
+frames). Peak memory is the Python heap peak of one extra run under
+tracemalloc, which is deterministic enough to gate on; the process RSS peak
+and per-stage timings from src.metrics are reported alongside.
+
+Throughput is machine-dependent, so record the baseline on the machine that
+runs the comparison (e.g. the CI runner) rather than a laptop.
+
+Exit status is 1 if any benchmark failed or regressed, or if there is no
+baseline to gate against (the file is missing or lacks an entry for a
+result) unless --allow-missing-baseline is passed; 0 otherwise.
+
+Depends on: librosa, numpy, opencv-python (mediapipe for check_mouth_visibility)
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src import metrics
+from src.audio_analysis import analyze_audio, detect_sections, extract_vocal_segment, load_audio
+from src.lipsync_processor import LipsyncProcessor
+from src.processors import QualityChecker
+
+from .fixtures import DEFAULT_SR, audio_fixture, phoneme_track, video_fixture
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_FIXTURES_DIR = os.path.join(tempfile.gettempdir(), "musicapp-bench-fixtures")
+
+# Audio duration in seconds per size
+AUDIO_SIZES = {"small": 15.0, "medium": 60.0, "large": 180.0}
+# (duration s, width, height) per size, at 24 fps
+VIDEO_SIZES = {"small": (2.0, 480, 270), "medium": (4.0, 854, 480), "large": (8.0, 1280, 720)}
+VIDEO_FPS = 24.0
+
+BPM = 120.0
+
+# A setup returns (callable to time, units of work per call)
+Setup = Callable[[str, str], Tuple[Callable[[], Any], float]]
+
+
+def _setup_analyze_audio(size: str, fixtures_dir: str):
+    duration = AUDIO_SIZES[size]
+    path = audio_fixture(fixtures_dir, duration, bpm=BPM)
+
+    def run():
+        result = analyze_audio(path)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+    return run, duration * DEFAULT_SR
+
+
+def _setup_detect_sections(size: str, fixtures_dir: str):
+    import librosa
+
+    duration = AUDIO_SIZES[size]
+    y, sr = load_audio(audio_fixture(fixtures_dir, duration, bpm=BPM))
+    _, beats = librosa.beat.beat_track(y=y, sr=sr)
+    beat_times = librosa.frames_to_time(beats, sr=sr)
+    return (lambda: detect_sections(y, sr, beat_times)), len(y)
+
+
+def _setup_extract_vocal_segment(size: str, fixtures_dir: str):
+    duration = AUDIO_SIZES[size]
+    path = audio_fixture(fixtures_dir, duration, bpm=BPM)
+
+    def run():
+        segment = extract_vocal_segment(path, duration * 0.25, duration * 0.75)
+        if segment is None:
+            raise RuntimeError("extract_vocal_segment returned None")
+        return segment
+
+    # Decoding the whole file dominates, so count the full input
+    return run, duration * DEFAULT_SR
+
+
+def _setup_lipsync_process(size: str, fixtures_dir: str):
+    duration, width, height = VIDEO_SIZES[size]
+    video = video_fixture(fixtures_dir, duration, width, height, fps=VIDEO_FPS)
+    audio = audio_fixture(fixtures_dir, duration, bpm=BPM)
+    phonemes = phoneme_track(duration)
+    output = os.path.join(fixtures_dir, f"lipsync_out_{size}.mp4")
+
+    def run():
+        if not LipsyncProcessor(video, audio, phonemes).process(output):
+            raise RuntimeError("LipsyncProcessor.process failed")
+
+    return run, int(duration * VIDEO_FPS)
+
+
+def _setup_check_mouth_visibility(size: str, fixtures_dir: str):
+    if importlib.util.find_spec("mediapipe") is None:
+        raise SkipBenchmark("mediapipe is not installed")
+
+    duration, width, height = VIDEO_SIZES[size]
+    video = video_fixture(fixtures_dir, duration, width, height, fps=VIDEO_FPS)
+    checker = QualityChecker()
+    # check_mouth_visibility samples at most the first 30 frames
+    return (lambda: checker.check_mouth_visibility(video)), min(30, int(duration * VIDEO_FPS))
+
+
+BENCHMARKS: Dict[str, Tuple[str, Setup]] = {
+    "analyze_audio": ("samples", _setup_analyze_audio),
+    "detect_sections": ("samples", _setup_detect_sections),
+    "extract_vocal_segment": ("samples", _setup_extract_vocal_segment),
+    "lipsync_process": ("frames", _setup_lipsync_process),
+    "check_mouth_visibility": ("frames", _setup_check_mouth_visibility),
+}
+
+
+class SkipBenchmark(Exception):
+    """Raised by a setup when an optional dependency is missing"""
+
+
+def measure(name: str, fn: Callable[[], Any], units: float, repeat: int) -> Dict[str, Any]:
+    """Warm up once, time ``repeat`` runs, then one run under tracemalloc"""
+    fn()
+
+    times, peak_rss, stages = [], 0, {}
+    for i in range(repeat):
+        rss_before = metrics.current_rss()
+        with metrics.track_job({"type": name, "id": f"bench-{i}"}) as job_metrics:
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+        peak_rss = max(peak_rss, job_metrics.peak_rss_bytes - rss_before)
+        stages = job_metrics.summary()["stages"]
+
+    tracemalloc.start()
+    fn()
+    _, peak_heap = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(times)
+    return {
+        "median_s": median,
+        "min_s": min(times),
+        "throughput": units / median if median > 0 else 0.0,
+        "peak_heap_mb": peak_heap / 1024 ** 2,
+        "peak_rss_delta_mb": peak_rss / 1024 ** 2,
+        "stages": stages,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    memory_tolerance: float,
+) -> List[str]:
+    """Return a message for every result worse than its baseline entry"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {result['throughput']:.0f} < baseline {base['throughput']:.0f} "
+                f"(-{100 * (1 - result['throughput'] / base['throughput']):.0f}%)"
+            )
+        if result["peak_heap_mb"] > base["peak_heap_mb"] * (1 + memory_tolerance):
+            regressions.append(
+                f"{key}: peak heap {result['peak_heap_mb']:.1f} MB > baseline {base['peak_heap_mb']:.1f} MB"
+            )
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    import librosa
+    import cv2
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Python workers")
+    parser.add_argument("--only", help="comma-separated benchmark names", default=",".join(BENCHMARKS))
+    parser.add_argument("--sizes", help="comma-separated sizes", default=",".join(AUDIO_SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument(
+        "--allow-missing-baseline",
+        action="store_true",
+        help="report instead of failing when the baseline file or an entry in it is missing",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed throughput drop (fraction)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.20, help="allowed peak heap growth (fraction)")
+    parser.add_argument("--fixtures-dir", default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument("--json", help="also write full results to this path")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",") if name.strip()]
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [name for name in names if name not in BENCHMARKS] + [s for s in sizes if s not in AUDIO_SIZES]
+    if unknown:
+        parser.error(f"unknown benchmark or size: {', '.join(unknown)}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    failures: List[str] = []
+    print(f"{'benchmark':<36} {'median':>9} {'throughput':>18} {'heap MB':>9} {'rss MB':>8}")
+    for name in names:
+        unit, setup = BENCHMARKS[name]
+        for size in sizes:
+            key = f"{name}[{size}]"
+            try:
+                fn, units = setup(size, args.fixtures_dir)
+                result = measure(name, fn, units, args.repeat)
+            except SkipBenchmark as e:
+                print(f"{key:<36} skipped: {e}")
+                continue
+            except Exception as e:
+                print(f"{key:<36} FAILED: {e}")
+                failures.append(f"{key}: {e}")
+                continue
+            result["unit"] = unit
+            results[key] = result
+            print(
+                f"{key:<36} {result['median_s']:>8.3f}s {result['throughput']:>11.0f} {unit}/s "
+                f"{result['peak_heap_mb']:>9.1f} {result['peak_rss_delta_mb']:>8.1f}"
+            )
+
+    env = environment()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": env, "results": results}, f, indent=2)
+
+    if failures:
+        print("\nFailed:")
+        for message in failures:
+            print(f"  {message}")
+        return 1
+
+    if args.update_baseline:
+        baseline = {"environment": env, "results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline["results"] = json.load(f).get("results", {})
+        baseline["results"].update(
+            {key: {"throughput": r["throughput"], "peak_heap_mb": r["peak_heap_mb"]} for key, r in results.items()}
+        )
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one")
+        return 0 if args.allow_missing_baseline else 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("environment") != env:
+        print(f"\nWarning: baseline was recorded on {baseline.get('environment')}, this is {env}")
+
+    missing = [key for key in results if key not in baseline.get("results", {})]
+    if missing:
+        print(f"\nNo baseline entry for: {', '.join(missing)}; run with --update-baseline to record them")
+        if not args.allow_missing_baseline:
+            return 1
+
+    regressions = compare(results, baseline.get("results", {}), args.tolerance, args.memory_tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
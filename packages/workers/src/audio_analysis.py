@@ -5,14 +5,37 @@ Depends on: librosa, scipy, numpy
 """
 
 import librosa
+import logging
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import json
 
+try:
+    from . import metrics
+except ImportError:
+    # Run as a script for a quick test (python src/audio_analysis.py ...); metrics
+    # only needs the standard library, so import it from this directory
+    import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def load_audio(audio_path: str, sr: int = 22050) -> Tuple[np.ndarray, int]:
+    """
+    Decode and resample an audio file to mono.
+    
+    Every analysis entry point below accepts the returned signal via ``y`` so
+    callers that run several of them on one file only decode it once.
+    """
+    with metrics.stage("decode"):
+        y, sr = librosa.load(audio_path, sr=sr, mono=True)
+    return y, sr
+
 
 def analyze_audio(
     audio_path: str,
     sr: int = 22050,
+    y: Optional[np.ndarray] = None,
 ) -> Dict[str, Any]:
     """
     Analyze an audio file for music structure.
@@ -20,6 +43,7 @@ def analyze_audio(
     Args:
         audio_path: path to MP3 or WAV
         sr: sample rate (default 22050 Hz)
+        y: already-decoded mono signal at ``sr``; loaded from audio_path if None
     
     Returns:
         dict with:
@@ -31,23 +55,31 @@ def analyze_audio(
     """
     try:
         # Load audio
-        y, sr = librosa.load(audio_path, sr=sr)
+        if y is None:
+            y, sr = load_audio(audio_path, sr=sr)
         duration = librosa.get_duration(y=y, sr=sr)
+        metrics.count("samples", len(y))
+        
+        # Onset envelope (mel spectrogram flux), shared by beats, onsets and sections
+        with metrics.stage("onset_strength"):
+            onset_env = librosa.onset.onset_strength(y=y, sr=sr)
         
         # Detect tempo and beats
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        tempo, beats = librosa.beat.beat_track(onset_env=onset_env, sr=sr)
-        beat_times = librosa.frames_to_time(beats, sr=sr)
+        with metrics.stage("beat_tracking"):
+            tempo, beats = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr)
+            beat_times = librosa.frames_to_time(beats, sr=sr)
         
         # Onset detection (transients)
-        onsets = librosa.onset.onset_detect(y=y, sr=sr, units='time')
+        with metrics.stage("onset_detection"):
+            onsets = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, units='time')
         
-        # Spectral centroid (brightness) — proxy for energy/mood
-        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-        
-        # RMS energy
-        rms = librosa.feature.rms(y=y)[0]
-        rms_normalized = rms / (rms.max() + 1e-8)
+        with metrics.stage("stft_features"):
+            # Spectral centroid (brightness) — proxy for energy/mood
+            spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
+            
+            # RMS energy
+            rms = librosa.feature.rms(y=y)[0]
+            rms_normalized = rms / (rms.max() + 1e-8)
         
         # Time grid for energy curve
         frames = np.arange(len(rms))
@@ -55,10 +87,11 @@ def analyze_audio(
         
         # Detect sections (simplified: using spectral flux)
         # In production, use librosa.segment.agglomerative or other methods
-        sections = detect_sections(y, sr, beat_times)
+        with metrics.stage("section_detection"):
+            sections = detect_sections(y, sr, beat_times, onset_env=onset_env)
         
         return {
-            'bpm': float(tempo),
+            'bpm': float(np.atleast_1d(tempo)[0]),
             'duration': float(duration),
             'beats': [
                 {
@@ -82,7 +115,7 @@ def analyze_audio(
             }
         }
     except Exception as e:
-        print(f"Error analyzing audio: {e}")
+        logger.error(f"Error analyzing audio: {e}")
         return {
             'error': str(e),
             'bpm': 120.0,  # Default fallback
@@ -92,7 +125,12 @@ def analyze_audio(
         }
 
 
-def detect_sections(y: np.ndarray, sr: int, beat_times: np.ndarray) -> List[Dict[str, Any]]:
+def detect_sections(
+    y: np.ndarray,
+    sr: int,
+    beat_times: np.ndarray,
+    onset_env: Optional[np.ndarray] = None,
+) -> List[Dict[str, Any]]:
     """
     Simple section detection based on spectral flux.
     
@@ -103,7 +141,8 @@ def detect_sections(y: np.ndarray, sr: int, beat_times: np.ndarray) -> List[Dict
     chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
     
     # Compute onset strength as proxy for section changes
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+    if onset_env is None:
+        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
     frames = np.arange(len(onset_env))
     times = librosa.frames_to_time(frames, sr=sr)
     
@@ -138,6 +177,7 @@ def extract_vocal_segment(
     start_time: float,
     end_time: float,
     sr: int = 22050,
+    y: Optional[np.ndarray] = None,
 ) -> Optional[np.ndarray]:
     """
     Extract a vocal segment (e.g., for per-scene extraction).
@@ -147,20 +187,23 @@ def extract_vocal_segment(
         start_time: segment start in seconds
         end_time: segment end in seconds
         sr: sample rate
+        y: already-decoded mono signal at ``sr``; loaded from audio_path if None
     
     Returns:
         numpy array of audio samples for the segment, or None on error
     """
     try:
-        y, sr = librosa.load(audio_path, sr=sr, mono=True)
+        if y is None:
+            y, sr = load_audio(audio_path, sr=sr)
         
         start_sample = int(start_time * sr)
         end_sample = int(end_time * sr)
         
         segment = y[start_sample:end_sample]
+        metrics.count("samples", len(segment))
         return segment
     except Exception as e:
-        print(f"Error extracting vocal segment: {e}")
+        logger.error(f"Error extracting vocal segment: {e}")
         return None
 
 
@@ -168,6 +211,7 @@ def detect_phonemes_and_words(
     audio_path: str,
     transcript: str,
     sr: int = 22050,
+    y: Optional[np.ndarray] = None,
 ) -> Dict[str, List[Dict[str, float]]]:
     """
     Detect phoneme and word boundaries using forced alignment (simplified).
@@ -179,13 +223,17 @@ def detect_phonemes_and_words(
         audio_path: path to audio
         transcript: full text transcript
         sr: sample rate
+        y: already-decoded mono signal at ``sr``; loaded from audio_path if None
     
     Returns:
-        dict with 'phonemes' and 'words' arrays of {text, start_time, end_time}
+        dict with 'phonemes' and 'words' arrays of {text, start_time, end_time},
+        plus 'error' (and empty arrays) if alignment failed
     """
     try:
-        y, sr = librosa.load(audio_path, sr=sr, mono=True)
+        if y is None:
+            y, sr = load_audio(audio_path, sr=sr)
         duration = librosa.get_duration(y=y, sr=sr)
+        metrics.count("samples", len(y))
         
         # Placeholder: evenly distribute words over duration
         words = transcript.split()
@@ -226,8 +274,8 @@ def detect_phonemes_and_words(
             'phonemes': phonemes_data,
         }
     except Exception as e:
-        print(f"Error detecting phonemes: {e}")
-        return {'words': [], 'phonemes': []}
+        logger.error(f"Error detecting phonemes: {e}")
+        return {'error': str(e), 'words': [], 'phonemes': []}
 
 
 if __name__ == '__main__':
@@ -0,0 +1,273 @@
+"""
+Job fusion — runs sibling audio jobs for one project over a single decoded signal.
+
+The backend enqueues analyze_audio, vocal_extraction and forced_alignment for a
+project as separate jobs, and each of them would otherwise decode and resample
+the same source file. When the worker dequeues one of these it claims the
+queued siblings for the same projectId, runs the group as a small DAG over a
+shared signal, and hands back one result per job so each is published on its
+own exactly as if it had run alone.
+
+Payload fields read from job.data (or job.payload):
+    analyze_audio      audioPath, sampleRate?
+    vocal_extraction   audioPath (the project audio), startTime?, endTime?, sampleRate?
+    forced_alignment   lyricExcerpt, vocalPath? or audioPath + startTime/endTime?
+
+vocal_extraction writes the scene's slice of the mix (mono PCM_16 at the
+job's sample rate) to <WORK_DIR>/<projectId>/<sceneId>/vocal_segment.wav and
+returns it as segmentPath. That is deliberately not the backend's vocals.wav,
+a high-passed full-track file that its vocal segments point at, which this
+worker never overwrites.
+
+The backend's forced_alignment jobs only carry a vocalSegmentId. When no
+vocalPath or audioPath is given, the aligner uses the segment a
+vocal_extraction for the same scene produced earlier in the group, or else
+reads the backend's vocals.wav for the scene.
+
+Depends on: librosa, numpy, soundfile
+"""
+
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from . import metrics
+from .audio_analysis import (
+    analyze_audio,
+    detect_phonemes_and_words,
+    extract_vocal_segment,
+    load_audio,
+)
+from .queue_client import job_data
+
+logger = logging.getLogger(__name__)
+
+# Job types that read the project audio and can share one decode.
+# Order is the DAG order: alignment consumes the segment extraction produced.
+FUSIBLE_JOB_TYPES = ("analyze_audio", "vocal_extraction", "forced_alignment")
+
+DEFAULT_SAMPLE_RATE = 22050
+
+WORK_DIR = os.getenv("WORK_DIR", "/tmp/processing")
+
+# How far into the queue to look for siblings, so a deep queue is not scanned
+# end to end on every dequeue.
+SIBLING_SCAN_DEPTH = 256
+MAX_FUSED_JOBS = 16
+
+
+class SharedAudio:
+    """Decoded signal for one (audio_path, sr) pair, loaded on first use"""
+
+    def __init__(self, audio_path: str, sr: int = DEFAULT_SAMPLE_RATE):
+        self.audio_path = audio_path
+        self.sr = sr
+        self._y: Optional[np.ndarray] = None
+
+    @property
+    def y(self) -> np.ndarray:
+        if self._y is None:
+            logger.info(f"[JobFusion] Decoding {self.audio_path} at {self.sr} Hz")
+            self._y, self.sr = load_audio(self.audio_path, sr=self.sr)
+        return self._y
+
+    @property
+    def duration(self) -> float:
+        return len(self.y) / float(self.sr)
+
+    def segment(self, start_time: float, end_time: float) -> np.ndarray:
+        """Slice [start_time, end_time) seconds out of the shared signal"""
+        return self.y[int(start_time * self.sr):int(end_time * self.sr)]
+
+
+def _scene_dir(job: Dict[str, Any]) -> str:
+    return os.path.join(WORK_DIR, str(job.get("projectId")), str(job.get("sceneId")))
+
+
+def vocal_path(job: Dict[str, Any]) -> str:
+    """The backend's extracted vocals for a scene"""
+    return os.path.join(_scene_dir(job), "vocals.wav")
+
+
+def segment_path(job: Dict[str, Any]) -> str:
+    """Where vocal_extraction writes a scene's segment"""
+    return os.path.join(_scene_dir(job), "vocal_segment.wav")
+
+
+def input_path(job: Dict[str, Any]) -> Optional[str]:
+    """The audio file a fusible job reads"""
+    data = job_data(job)
+    if job.get("type") == "forced_alignment":
+        if data.get("vocalPath"):
+            return data["vocalPath"]
+        if data.get("audioPath"):
+            return data["audioPath"]
+        return vocal_path(job) if job.get("sceneId") else None
+    return data.get("audioPath")
+
+
+def is_fusible(job: Dict[str, Any]) -> bool:
+    return job.get("type") in FUSIBLE_JOB_TYPES and bool(job.get("projectId"))
+
+
+def is_sibling(job: Dict[str, Any], candidate: Dict[str, Any]) -> bool:
+    """True if ``candidate`` can run in the same fused group as ``job``"""
+    return is_fusible(candidate) and candidate.get("projectId") == job.get("projectId")
+
+
+def claim_sibling_jobs(
+    queue_client,
+    job: Dict[str, Any],
+    scheduler=None,
+    scan_depth: int = SIBLING_SCAN_DEPTH,
+    max_jobs: int = MAX_FUSED_JOBS,
+) -> List[Dict[str, Any]]:
+    """
+    Collect jobs that can be fused with ``job``.
+
+    Siblings this worker has already dequeued are taken out of the
+    scheduler's ready queues first; the rest are claimed from the shared
+    queue through the QueueClient, which moves them onto this worker's
+    processing list, and recorded as started so the scheduler reports
+    their latency.
+    """
+    if not is_fusible(job):
+        return []
+
+    def matches(candidate: Dict[str, Any]) -> bool:
+        return is_sibling(job, candidate)
+
+    siblings = scheduler.take(matches, max_jobs - 1) if scheduler is not None else []
+    claimed = queue_client.claim(matches, max_jobs=max_jobs - 1 - len(siblings), scan_depth=scan_depth)
+    if scheduler is not None:
+        scheduler.record_started(claimed)
+    return siblings + claimed
+
+
+def _segment_bounds(data: Dict[str, Any], audio: SharedAudio) -> Tuple[float, float]:
+    start_time = float(data.get("startTime", 0.0))
+    end_time = data.get("endTime")
+    return start_time, float(end_time) if end_time is not None else audio.duration
+
+
+def _run_analyze_audio(
+    job: Dict[str, Any],
+    audio: SharedAudio,
+    segments: Dict[str, Tuple[np.ndarray, int]],
+) -> Dict[str, Any]:
+    analysis = analyze_audio(audio.audio_path, sr=audio.sr, y=audio.y)
+    if "error" in analysis:
+        raise RuntimeError(analysis["error"])
+    return analysis
+
+
+def _run_vocal_extraction(
+    job: Dict[str, Any],
+    audio: SharedAudio,
+    segments: Dict[str, Tuple[np.ndarray, int]],
+) -> Dict[str, Any]:
+    if not job.get("sceneId"):
+        raise ValueError("vocal_extraction job has no sceneId")
+
+    start_time, end_time = _segment_bounds(job_data(job), audio)
+    segment = extract_vocal_segment(
+        audio.audio_path, start_time, end_time, sr=audio.sr, y=audio.y
+    )
+    if segment is None:
+        raise RuntimeError("Vocal extraction failed")
+
+    output_path = segment_path(job)
+    with metrics.stage("encode"):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        sf.write(output_path, segment, audio.sr, subtype="PCM_16")
+
+    # A forced_alignment for this scene later in the group aligns against
+    # these samples directly
+    segments[_scene_dir(job)] = (segment, audio.sr)
+    return {
+        "segmentPath": output_path,
+        "sceneId": job.get("sceneId"),
+        "startTime": start_time,
+        "endTime": end_time,
+        "duration": len(segment) / float(audio.sr),
+        "sampleRate": audio.sr,
+    }
+
+
+def _run_forced_alignment(
+    job: Dict[str, Any],
+    audio: SharedAudio,
+    segments: Dict[str, Tuple[np.ndarray, int]],
+) -> Dict[str, Any]:
+    data = job_data(job)
+    transcript = data.get("lyricExcerpt") or data.get("transcript") or ""
+
+    # Without an explicit input, prefer the segment an upstream
+    # vocal_extraction in this group produced
+    y, sr = None, audio.sr
+    if not data.get("vocalPath") and not data.get("audioPath"):
+        y, sr = segments.get(_scene_dir(job), (None, audio.sr))
+    if y is None:
+        # Only a full-mix audioPath needs slicing; vocalPath is already the scene
+        sliced = not data.get("vocalPath") and data.get("audioPath") and "startTime" in data
+        y = audio.segment(*_segment_bounds(data, audio)) if sliced else audio.y
+
+    alignment = detect_phonemes_and_words(audio.audio_path, transcript, sr=sr, y=y)
+    if "error" in alignment:
+        raise RuntimeError(alignment["error"])
+    return alignment
+
+
+_STAGES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "analyze_audio": _run_analyze_audio,
+    "vocal_extraction": _run_vocal_extraction,
+    "forced_alignment": _run_forced_alignment,
+}
+
+
+def run_fused_jobs(jobs: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Run a group of fusible jobs, decoding each distinct audio input once.
+
+    Returns:
+        list of (job, result) pairs, one per input job, where result matches
+        the backend's ProcessingResult shape: {success, error?, data?, duration}
+        plus per-job instrumentation under "metrics"
+    """
+    shared: Dict[Tuple[str, int], SharedAudio] = {}
+    # Extracted vocals by scene directory
+    segments: Dict[str, Tuple[np.ndarray, int]] = {}
+    results = []
+
+    # Stable sort keeps queue order within a stage
+    ordered = sorted(jobs, key=lambda j: FUSIBLE_JOB_TYPES.index(j.get("type")))
+
+    for job in ordered:
+        started = time.perf_counter()
+        data = job_data(job)
+        audio_path = input_path(job)
+        # The shared decode is attributed to whichever job triggers it first
+        with metrics.track_job(job) as job_metrics:
+            try:
+                if not audio_path:
+                    raise ValueError("Job has no audioPath")
+
+                key = (audio_path, int(data.get("sampleRate", DEFAULT_SAMPLE_RATE)))
+                if key not in shared:
+                    shared[key] = SharedAudio(*key)
+
+                output = _STAGES[job["type"]](job, shared[key], segments)
+                result = {"success": True, "data": output}
+            except Exception as e:
+                logger.error(f"[JobFusion] {job.get('type')} failed for project {job.get('projectId')}: {e}")
+                result = {"success": False, "error": str(e)}
+
+        result["duration"] = int((time.perf_counter() - started) * 1000)
+        result["metrics"] = job_metrics.summary()
+        results.append((job, result))
+
+    return results
@@ -8,10 +8,20 @@ Depends on: opencv-python, librosa, scipy, tensorflow/torch (optional, for pose
 """
 
 import cv2
+import logging
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 import json
 
+try:
+    from . import metrics
+except ImportError:
+    # Run as a script for a quick test (python src/lipsync_processor.py ...); metrics
+    # only needs the standard library, so import it from this directory
+    import metrics
+
+logger = logging.getLogger(__name__)
+
 
 class LipsyncProcessor:
     """Main lip-sync post-processor."""
@@ -51,14 +61,15 @@ class LipsyncProcessor:
             out = cv2.VideoWriter(output_path, fourcc, self.fps, (self.width, self.height))
             
             if not out.isOpened():
-                print(f"Failed to open output video writer: {output_path}")
+                logger.error(f"Failed to open output video writer: {output_path}")
                 return False
             
             frame_idx = 0
             mouth_blend_buffer = {}  # Cache for smoothing between frames
             
             while True:
-                ret, frame = self.cap.read()
+                with metrics.stage("decode"):
+                    ret, frame = self.cap.read()
                 if not ret:
                     break
                 
@@ -80,17 +91,20 @@ class LipsyncProcessor:
                     )
                 
                 # Write frame
-                out.write(frame)
+                with metrics.stage("encode"):
+                    out.write(frame)
                 frame_idx += 1
             
+            metrics.count("frames", frame_idx)
+            
             self.cap.release()
             out.release()
             
-            print(f"Lip-sync processing complete: {output_path}")
+            logger.info(f"Lip-sync processing complete: {output_path}")
             return True
             
         except Exception as e:
-            print(f"Error during lip-sync processing: {e}")
+            logger.error(f"Error during lip-sync processing: {e}")
             return False
     
     def _detect_mouth_region(self, frame: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
@@ -134,7 +148,8 @@ class LipsyncProcessor:
         Returns:
             modified frame
         """
-        mouth_region = self._detect_mouth_region(frame)
+        with metrics.stage("face_detection"):
+            mouth_region = self._detect_mouth_region(frame)
         if mouth_region is None:
             return frame
         
@@ -152,27 +167,28 @@ class LipsyncProcessor:
         is_vowel = len(phoneme_text) > 0 and phoneme_text[0] in vowels
         
         if is_vowel and h > 0:
-            # Slight vertical stretching for vowels
-            scale_y = 1.0 + expand_factor
-            new_height = int(h * scale_y)
+            with metrics.stage("warp"):
+                # Slight vertical stretching for vowels
+                scale_y = 1.0 + expand_factor
+                new_height = int(h * scale_y)
             
-            # Center the expansion
-            y_offset = (new_height - h) // 2
-            new_y = max(0, y - y_offset)
-            new_h = min(frame.shape[0] - new_y, new_height)
+                # Center the expansion
+                y_offset = (new_height - h) // 2
+                new_y = max(0, y - y_offset)
+                new_h = min(frame.shape[0] - new_y, new_height)
             
-            # Resize and blend
-            resized = cv2.resize(mouth_roi, (w, new_h - h))
+                # Resize and blend
+                resized = cv2.resize(mouth_roi, (w, new_h - h))
             
-            # Feather blend to avoid hard edges
-            alpha = 0.7
-            blend_region = frame[new_y:new_y+new_h, x:x+w]
-            if blend_region.shape == resized.shape:
-                frame[new_y:new_y+new_h, x:x+w] = cv2.addWeighted(
-                    resized, alpha,
-                    blend_region, 1 - alpha,
-                    0
-                )
+                # Feather blend to avoid hard edges
+                alpha = 0.7
+                blend_region = frame[new_y:new_y+new_h, x:x+w]
+                if blend_region.shape == resized.shape:
+                    frame[new_y:new_y+new_h, x:x+w] = cv2.addWeighted(
+                        resized, alpha,
+                        blend_region, 1 - alpha,
+                        0
+                    )
         
         return frame
 
@@ -0,0 +1,377 @@
+"""
+Worker instrumentation — per-stage timings, throughput counters, peak RSS and
+opt-in profiling, exposed as Prometheus text and attached to job results.
+
+Processing code marks its stages and work done without knowing which job it is
+running for:
+
+    with metrics.stage("decode"):
+        y, sr = librosa.load(path)
+    metrics.count("samples", len(y))
+
+The worker wraps each job in track_job(), which binds those calls (on the
+job's thread) to a JobMetrics collector whose summary() goes into the result
+metadata. Everything is also aggregated in REGISTRY, which
+start_metrics_server() serves at http://<METRICS_HOST>:<METRICS_PORT>/metrics.
+
+Profiling is opt-in per job type via PROFILE_JOBS (comma-separated, or "*"),
+or per job with data.profile = true. PROFILE_MODE=sample (default) runs a
+low-overhead stack sampler that writes collapsed stacks for flame graphs;
+PROFILE_MODE=cprofile writes a cProfile .prof file.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9400"))
+# Local-only by default; set METRICS_HOST=0.0.0.0 to let a remote Prometheus scrape
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+PROFILE_JOBS = {name.strip() for name in os.getenv("PROFILE_JOBS", "").split(",") if name.strip()}
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getenv("WORK_DIR", "/tmp/processing"), "profiles"))
+
+RSS_SAMPLE_INTERVAL = 0.05
+PROFILE_SAMPLE_INTERVAL = 0.01
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs (e.g. macOS): fall back to the lifetime peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and summaries in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self._help[name] = (metric_type, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[name][key] = self._values[name].get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[name][key] = value
+
+    def observe(self, name: str, value: float, **labels: str):
+        """Record one observation of a summary (exported as _count and _sum)"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[f"{name}_count"][key] = self._values[f"{name}_count"].get(key, 0.0) + 1
+            self._values[f"{name}_sum"][key] = self._values[f"{name}_sum"].get(key, 0.0) + value
+
+    def add_collector(self, collector: Callable[[], List[Tuple[str, str, str, Dict[str, str], float]]]):
+        """
+        Register a callable evaluated at scrape time, returning
+        (name, type, help, labels, value) tuples.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+        help_by_name = dict(self._help)
+
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.error(f"[Metrics] Collector failed: {e}")
+                continue
+            for name, metric_type, help_text, labels, value in samples:
+                help_by_name.setdefault(name, (metric_type, help_text))
+                values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+        lines = []
+        for name in sorted(values):
+            family = name[:-6] if name.endswith("_count") else name[:-4] if name.endswith("_sum") else name
+            if family in help_by_name and (family == name or name.endswith("_count")):
+                metric_type, help_text = help_by_name[family]
+                lines.append(f"# HELP {family} {help_text}")
+                lines.append(f"# TYPE {family} {metric_type}")
+            for labels, value in sorted(values[name].items()):
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                value_text = _format_value(value)
+                lines.append(f"{name}{{{label_text}}} {value_text}" if label_text else f"{name} {value_text}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("worker_stage_seconds", "summary", "Time spent in each processing stage")
+REGISTRY.describe("worker_job_seconds", "summary", "Wall time of each job")
+REGISTRY.describe("worker_samples_processed_total", "counter", "Audio samples processed")
+REGISTRY.describe("worker_frames_processed_total", "counter", "Video frames processed")
+REGISTRY.describe("worker_job_peak_rss_bytes", "gauge", "Peak process RSS during the last job of each type")
+REGISTRY.add_collector(
+    lambda: [("worker_process_resident_bytes", "gauge", "Current process RSS", {}, current_rss())]
+)
+
+
+class JobMetrics:
+    """Stage timings, work counters and peak RSS for one job"""
+
+    def __init__(self, job_type: str, job_id: str):
+        self.job_type = job_type
+        self.job_id = job_id
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, float] = defaultdict(float)
+        self.peak_rss_bytes = current_rss()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.profile: Optional[Dict[str, Any]] = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self) -> Dict[str, Any]:
+        seconds = self.seconds
+        summary = {
+            "seconds": round(seconds, 4),
+            "stages": {name: round(value, 4) for name, value in self.stages.items()},
+            "peakRssBytes": self.peak_rss_bytes,
+        }
+        for name, value in self.counts.items():
+            summary[name] = int(value)
+            if seconds > 0:
+                summary[f"{name}PerSecond"] = round(value / seconds, 1)
+        if self.profile:
+            summary["profile"] = self.profile
+        return summary
+
+
+_local = threading.local()
+_active_jobs: Dict[int, JobMetrics] = {}
+_active_lock = threading.Lock()
+_rss_sampler: Optional[threading.Thread] = None
+
+
+def current_job() -> Optional[JobMetrics]:
+    return getattr(_local, "job", None)
+
+
+def _job_type() -> str:
+    job = current_job()
+    return job.job_type if job else "none"
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a processing stage for the current job (and the process totals)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        job = current_job()
+        if job is not None:
+            job.stages[name] += elapsed
+        REGISTRY.observe("worker_stage_seconds", elapsed, job_type=_job_type(), stage=name)
+
+
+def count(unit: str, value: float):
+    """Add processed work in ``unit`` ("samples" or "frames") to the current job"""
+    job = current_job()
+    if job is not None:
+        job.counts[unit] += value
+    REGISTRY.inc(f"worker_{unit}_processed_total", value, job_type=_job_type())
+
+
+def _sample_rss():
+    while True:
+        time.sleep(RSS_SAMPLE_INTERVAL)
+        with _active_lock:
+            jobs = list(_active_jobs.values())
+        if jobs:
+            rss = current_rss()
+            for job in jobs:
+                job.peak_rss_bytes = max(job.peak_rss_bytes, rss)
+
+
+def _should_profile(job: Dict[str, Any]) -> bool:
+    data = job.get("data") or job.get("payload") or {}
+    return bool(data.get("profile")) or "*" in PROFILE_JOBS or job.get("type") in PROFILE_JOBS
+
+
+@contextmanager
+def track_job(job: Dict[str, Any]) -> Iterator[JobMetrics]:
+    """
+    Collect metrics for ``job`` on the current thread until the block exits.
+
+    Peak RSS is sampled for the whole process, so with several jobs running
+    concurrently it is an upper bound for each of them.
+    """
+    global _rss_sampler
+
+    metrics = JobMetrics(job.get("type", "unknown"), str(job.get("id", "")))
+    previous = current_job()
+    _local.job = metrics
+    thread_id = threading.get_ident()
+    with _active_lock:
+        _active_jobs[id(metrics)] = metrics
+        if _rss_sampler is None:
+            _rss_sampler = threading.Thread(target=_sample_rss, name="rss-sampler", daemon=True)
+            _rss_sampler.start()
+
+    profiler = None
+    if _should_profile(job):
+        profiler = CProfileHook() if PROFILE_MODE == "cprofile" else StackSampler(thread_id)
+        profiler.start()
+
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            metrics.profile = profiler.stop(f"{metrics.job_type}-{metrics.job_id}")
+        metrics.finished = time.perf_counter()
+        metrics.peak_rss_bytes = max(metrics.peak_rss_bytes, current_rss())
+        with _active_lock:
+            _active_jobs.pop(id(metrics), None)
+        _local.job = previous
+
+        REGISTRY.observe("worker_job_seconds", metrics.seconds, job_type=metrics.job_type)
+        REGISTRY.set("worker_job_peak_rss_bytes", metrics.peak_rss_bytes, job_type=metrics.job_type)
+
+
+class CProfileHook:
+    """Deterministic profile of the job's thread, saved as a .prof file"""
+
+    def __init__(self, top: int = 15):
+        self.top = top
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self, name: str) -> Dict[str, Any]:
+        self.profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.prof")
+        self.profiler.dump_stats(path)
+
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(self.top)
+        return {"mode": "cprofile", "path": path, "top": out.getvalue().splitlines()[-self.top - 1:]}
+
+
+class StackSampler:
+    """
+    py-spy style sampler: snapshots one thread's stack at a fixed interval
+    from a background thread and writes collapsed stacks for flame graphs.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL, top: int = 15):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.top = top
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self, name: str) -> Dict[str, Any]:
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.folded")
+        with open(path, "w") as f:
+            for stack, hits in self.stacks.items():
+                f.write(f"{stack} {hits}\n")
+
+        # Leaf frames where the most samples landed
+        leaves = Counter()
+        for stack, hits in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += hits
+        total = sum(leaves.values()) or 1
+        return {
+            "mode": "sample",
+            "path": path,
+            "samples": total,
+            "top": [f"{100.0 * hits / total:5.1f}% {leaf}" for leaf, hits in leaves.most_common(self.top)],
+        }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve REGISTRY at /metrics on a daemon thread; port 0 disables it.
+
+    Metrics are optional, so a port that is already taken (e.g. a second
+    worker on the same host) only logs a warning.
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"[Metrics] Could not serve metrics on {host}:{port}: {e}; continuing without")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"[Metrics] Serving Prometheus metrics on {host}:{port}/metrics")
+    return server
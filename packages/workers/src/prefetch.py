@@ -0,0 +1,375 @@
+"""
+Input prefetch — stages job inputs on local disk while the current job computes.
+
+Jobs reference their source audio and Sora-rendered videos by URL. Rather than
+have each job wait on its downloads before any CPU work starts, the worker
+hands upcoming jobs to an InputPrefetcher, which downloads them on an asyncio
+loop in a background thread into a local work directory. Identical URLs are
+fetched once, and staged files that no running job holds are evicted
+least-recently-used first to keep the directory within a disk budget.
+
+Each download reserves its size against the budget before the body is
+requested; a prefetch learns the size with a HEAD first. A prefetch that does
+not fit, or whose size is unknown, is skipped rather than queued, so nothing
+ever waits for space: an input a job is actually waiting on is always fetched,
+even if that takes the directory over budget while running jobs hold their
+files. Skipped and failed prefetches are not retried until a backoff expires,
+since the worker re-prefetches its upcoming jobs on every loop pass.
+
+Depends on: requests
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# URL fields a job may carry, and the local path field each one is staged into
+INPUT_FIELDS = {
+    "audioUrl": "audioPath",
+    "videoUrl": "videoPath",
+    "soraClipUrl": "videoPath",
+}
+
+DEFAULT_WORK_DIR = os.path.join(os.getenv("WORK_DIR", "/tmp/processing"), "prefetch")
+DEFAULT_MAX_BYTES = int(os.getenv("PREFETCH_MAX_BYTES", str(2 * 1024 ** 3)))
+DEFAULT_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv("PREFETCH_ACQUIRE_TIMEOUT", "600"))
+# Delay before a skipped or failed prefetch is tried again, doubling per attempt
+RETRY_BACKOFF_SECONDS = 30.0
+MAX_RETRY_BACKOFF_SECONDS = 600.0
+CHUNK_SIZE = 1024 * 1024
+
+
+class PrefetchSkipped(Exception):
+    """A speculative download was not started because it would exceed the disk budget"""
+
+
+class StagedFile:
+    """A downloaded input and the number of running jobs holding it"""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self.refs = 0
+
+
+class InputPrefetcher:
+    """Downloads job inputs ahead of time on a background asyncio loop"""
+
+    def __init__(
+        self,
+        work_dir: str = DEFAULT_WORK_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        api_base: Optional[str] = None,
+        session: Optional[requests.Session] = None,
+        request_timeout: float = 60.0,
+    ):
+        """
+        Args:
+            work_dir: directory downloads are staged in
+            max_bytes: disk budget for staged files and downloads in progress;
+                prefetches that would exceed it are skipped
+            concurrency: max simultaneous downloads (and pooled connections)
+            api_base: base for relative URLs, defaults to BACKEND_API_BASE
+            session: requests session to use instead of a pooled default
+            request_timeout: connect/read timeout per request, in seconds
+        """
+        self.work_dir = work_dir
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.api_base = api_base or os.getenv("BACKEND_API_BASE", "http://localhost:3000/api")
+        self.request_timeout = request_timeout
+        os.makedirs(work_dir, exist_ok=True)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        # Staging state is only touched on the loop thread
+        self._staged: "OrderedDict[str, StagedFile]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bytes of staged files plus reservations for downloads in progress
+        self._used_bytes = 0
+        # URL -> (monotonic time prefetching may retry, current backoff)
+        self._backoff: Dict[str, Tuple[float, float]] = {}
+        # Sizes learned from HEAD for URLs not yet staged
+        self._sizes: Dict[str, Optional[int]] = {}
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="prefetch", daemon=True)
+        self._thread.start()
+
+    # --- Public API (called from the worker thread) ------------------------
+
+    def prefetch(self, job: Dict[str, Any]):
+        """Start downloading a job's inputs without waiting for them"""
+        for url in self._job_urls(job).values():
+            asyncio.run_coroutine_threadsafe(self._stage(url, speculative=True), self._loop)
+
+    def acquire(self, job: Dict[str, Any], timeout: float = DEFAULT_ACQUIRE_TIMEOUT) -> Dict[str, str]:
+        """
+        Wait for a job's inputs, pin them until release(), and write their
+        local paths into the job's data (audioUrl -> audioPath, etc.).
+
+        If any input fails or the timeout passes, the inputs pinned so far
+        are unpinned again and nothing needs releasing.
+
+        Returns:
+            dict of path field -> local path
+
+        Raises:
+            Exception from the download if an input could not be fetched
+            concurrent.futures.TimeoutError if the inputs took longer than timeout
+        """
+        urls = self._job_urls(job)
+        if not urls:
+            return {}
+
+        future = asyncio.run_coroutine_threadsafe(self._acquire(list(urls.values())), self._loop)
+        try:
+            paths = future.result(timeout)
+        except BaseException:
+            # Cancelling the coroutine unpins whatever it had pinned; if it
+            # finished just as we gave up, unpin its result instead
+            if not future.cancel() and future.done() and future.exception() is None:
+                self.release(job)
+            raise
+
+        data = job.get("data") or job["payload"]
+        staged = {}
+        for field, url in urls.items():
+            staged[INPUT_FIELDS[field]] = paths[url]
+            data[INPUT_FIELDS[field]] = paths[url]
+        return staged
+
+    def release(self, job: Dict[str, Any]):
+        """Unpin a job's inputs so they can be evicted"""
+        urls = list(self._job_urls(job).values())
+        if urls:
+            asyncio.run_coroutine_threadsafe(self._release(urls), self._loop).result()
+
+    def close(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self._cancel_downloads(), self._loop).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"[Prefetch] Could not cancel downloads on close: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self.session.close()
+
+    # --- Loop-side implementation ------------------------------------------
+
+    def _job_urls(self, job: Dict[str, Any]) -> Dict[str, str]:
+        data = job.get("data") or job.get("payload") or {}
+        return {
+            field: urljoin(self.api_base.rstrip("/") + "/", data[field])
+            for field in INPUT_FIELDS
+            if data.get(field)
+        }
+
+    async def _cancel_downloads(self):
+        downloads = list(self._inflight.values())
+        for download in downloads:
+            download.cancel()
+        await asyncio.gather(*downloads, return_exceptions=True)
+
+    async def _acquire(self, urls) -> Dict[str, str]:
+        paths, pinned = {}, []
+        try:
+            for url in dict.fromkeys(urls):
+                staged = await self._stage(url)
+                staged.refs += 1
+                pinned.append(staged)
+                paths[url] = staged.path
+        except BaseException:
+            for staged in pinned:
+                staged.refs -= 1
+            self._evict()
+            raise
+        return paths
+
+    async def _release(self, urls):
+        for url in dict.fromkeys(urls):
+            staged = self._staged.get(url)
+            if staged is not None and staged.refs > 0:
+                staged.refs -= 1
+        self._evict()
+
+    async def _stage(self, url: str, speculative: bool = False) -> StagedFile:
+        """
+        Return the staged file for a URL, downloading it at most once.
+
+        A speculative stage (a prefetch) raises PrefetchSkipped instead of
+        going over budget or retrying a URL that is backing off; a
+        non-speculative one always downloads.
+        """
+        while True:
+            staged = self._staged.get(url)
+            if staged is not None:
+                self._staged.move_to_end(url)
+                return staged
+
+            if url not in self._inflight:
+                if speculative and self._backing_off(url):
+                    raise PrefetchSkipped(url)
+                self._inflight[url] = asyncio.ensure_future(self._download(url, speculative))
+            try:
+                # Shield so a cancelled waiter does not cancel the shared download
+                return await asyncio.shield(self._inflight[url])
+            except PrefetchSkipped:
+                if speculative:
+                    raise
+                # A prefetch of this URL gave up for lack of space; fetch it for real
+
+    async def _download(self, url: str, speculative: bool) -> StagedFile:
+        try:
+            parsed = urlparse(url)
+            if parsed.scheme == "file":
+                # Already on local disk (e.g. backend vocal stems); nothing to fetch
+                path = unquote(parsed.path)
+                staged = StagedFile(path, 0)
+            else:
+                async with self._semaphore:
+                    path = os.path.join(self.work_dir, self._filename(url))
+                    reserved = 0
+                    try:
+                        if speculative:
+                            # Size the file before requesting the body, so a
+                            # prefetch that does not fit costs only a HEAD
+                            expected = await self._remote_size(url)
+                            if not self._reserve(url, expected, speculative=True):
+                                raise PrefetchSkipped(url)
+                            reserved = expected
+                        response = await asyncio.to_thread(self._open, url)
+                        try:
+                            if not speculative:
+                                expected = int(response.headers.get("Content-Length") or 0)
+                                self._reserve(url, expected, speculative=False)
+                                reserved = expected
+                            size = await asyncio.to_thread(self._save, response, path)
+                        finally:
+                            response.close()
+                    except BaseException as e:
+                        self._used_bytes -= reserved
+                        if not isinstance(e, asyncio.CancelledError):
+                            self._back_off(url, e)
+                        raise
+                # Settle the reservation (no Content-Length, or compressed transfer)
+                self._used_bytes += size - reserved
+                self._backoff.pop(url, None)
+                self._sizes.pop(url, None)
+                staged = StagedFile(path, size)
+
+            # Evict before listing the new file, which the caller has yet to pin
+            self._evict()
+            self._staged[url] = staged
+            return staged
+        finally:
+            self._inflight.pop(url, None)
+
+    async def _remote_size(self, url: str) -> Optional[int]:
+        if url not in self._sizes:
+            self._sizes[url] = await asyncio.to_thread(self._head, url)
+        return self._sizes[url]
+
+    def _backing_off(self, url: str) -> bool:
+        backoff = self._backoff.get(url)
+        return backoff is not None and time.monotonic() < backoff[0]
+
+    def _back_off(self, url: str, error: BaseException):
+        _, previous = self._backoff.get(url, (0.0, 0.0))
+        delay = min(MAX_RETRY_BACKOFF_SECONDS, previous * 2 or RETRY_BACKOFF_SECONDS)
+        self._backoff[url] = (time.monotonic() + delay, delay)
+        if not isinstance(error, PrefetchSkipped):
+            logger.warning(f"[Prefetch] Could not fetch {url}: {error}; not prefetching it for {delay:.0f}s")
+
+    def _reserve(self, url: str, size: Optional[int], speculative: bool) -> bool:
+        """
+        Charge a download's size against the budget, evicting to make room.
+        An unknown size never fits a speculative download.
+        """
+        if size is None:
+            if speculative:
+                logger.info(f"[Prefetch] Skipping {url}: size unknown")
+                return False
+            size = 0
+        self._evict(reserve=size)
+        if self._used_bytes + size > self.max_bytes:
+            if speculative:
+                logger.info(f"[Prefetch] Skipping {url}: {size} bytes would exceed the disk budget")
+                return False
+            logger.warning(
+                f"[Prefetch] Over disk budget: fetching {url} ({size} bytes) with "
+                f"{self._used_bytes} of {self.max_bytes} bytes held by running jobs"
+            )
+        self._used_bytes += size
+        return True
+
+    def _evict(self, reserve: int = 0):
+        """Drop least-recently-used unpinned files until ``reserve`` more bytes fit"""
+        for url in list(self._staged):
+            if self._used_bytes + reserve <= self.max_bytes:
+                return
+            staged = self._staged[url]
+            if staged.refs or not staged.size:
+                continue
+            del self._staged[url]
+            self._used_bytes -= staged.size
+            try:
+                os.remove(staged.path)
+            except OSError:
+                pass
+            logger.info(f"[Prefetch] Evicted {staged.path} ({staged.size} bytes)")
+
+    def _filename(self, url: str) -> str:
+        _, ext = os.path.splitext(urlparse(url).path)
+        return hashlib.sha1(url.encode()).hexdigest() + ext
+
+    def _head(self, url: str) -> Optional[int]:
+        """Content-Length of a URL, or None if the server does not say; runs on a worker thread"""
+        response = self.session.head(url, allow_redirects=True, timeout=self.request_timeout)
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        return int(length) if length else None
+
+    def _open(self, url: str) -> requests.Response:
+        """Start a streaming GET, so the size is known before the body is read; runs on a worker thread"""
+        logger.info(f"[Prefetch] Downloading {url}")
+        response = self.session.get(url, stream=True, timeout=self.request_timeout)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    def _save(self, response: requests.Response, path: str) -> int:
+        """Stream a response body to disk; runs on a worker thread"""
+        partial = path + ".part"
+        try:
+            with open(partial, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, path)
+        return os.path.getsize(path)
@@ -2,6 +2,8 @@ import logging
 import numpy as np
 from typing import Dict, Any, Tuple, List
 
+from . import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -179,7 +181,8 @@ class QualityChecker:
                 min_detection_confidence=0.5
             ) as face_detection:
                 while True:
-                    ret, frame = cap.read()
+                    with metrics.stage("decode"):
+                        ret, frame = cap.read()
                     if not ret or frame_count >= max_frames:
                         break
 
@@ -187,8 +190,9 @@ class QualityChecker:
                     h, w = frame.shape[:2]
 
                     # Convert BGR to RGB
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    results = face_detection.process(rgb_frame)
+                    with metrics.stage("face_detection"):
+                        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                        results = face_detection.process(rgb_frame)
 
                     frame_visibility = 0.0
 
@@ -229,6 +233,7 @@ class QualityChecker:
                     visibility_scores.append(frame_visibility)
 
             cap.release()
+            metrics.count("frames", frame_count)
 
             # Calculate average visibility score
             avg_score = (
@@ -0,0 +1,396 @@
+"""
+Reliable Redis queue client for the Python workers.
+
+Jobs are moved atomically from the shared queue onto a per-worker processing
+list with BLMOVE, so a job popped before a crash is never lost: each worker
+keeps a heartbeat key alive, and any processing list whose heartbeat has
+expired for longer than the visibility timeout is pushed back onto the queue.
+
+Progress and heartbeat writes are buffered and sent as pipelined batches over
+a pooled connection instead of one round-trip per update. Results are written
+by each ack in its own pipeline, which also carries any buffered progress, so
+the caller learns whether its own writes succeeded.
+
+Every dequeued job is tagged with a random token (TOKEN_FIELD) that the client
+uses to track it until ack. The backend can enqueue byte-identical payloads
+(e.g. several takes of one scene), so neither the payload nor a hash of it
+identifies a single delivery. A job without an "id" also gets the token as its
+id, so each copy publishes its own result.
+
+Keys, for a queue named "processing":
+    processing                       pending jobs (JSON)
+    processing:processing:<worker>   jobs a worker has dequeued but not acked
+    processing:heartbeat:<worker>    worker liveness, expires after the visibility timeout
+    processing:progress              hash of jobId -> progress (0-100)
+    processing:results               pub/sub channel announcing finished jobIds
+    result:<jobId>                   job result (ProcessingResult JSON)
+
+Depends on: redis (any redis-py compatible client, e.g. fakeredis, can be passed in)
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+RESULT_KEY_PREFIX = "result:"
+RESULT_TTL_SECONDS = 24 * 60 * 60
+
+DEFAULT_VISIBILITY_TIMEOUT = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT", "900"))
+DEFAULT_BATCH_SIZE = int(os.getenv("QUEUE_BATCH_SIZE", "8"))
+DEFAULT_MAX_CONNECTIONS = 8
+
+# Set on every job this client hands out; identifies one delivery of a job
+TOKEN_FIELD = "_token"
+
+
+def job_data(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the job's parameters, which the backend sends as data or payload"""
+    return job.get("data") or job.get("payload") or {}
+
+
+def job_token(job: Dict[str, Any]) -> str:
+    """The job's delivery token, assigning one if it does not have one yet"""
+    return job.setdefault(TOKEN_FIELD, uuid.uuid4().hex)
+
+
+class QueueClient:
+    """At-least-once job queue over a Redis list"""
+
+    def __init__(
+        self,
+        queue_key: str = "processing",
+        redis_url: Optional[str] = None,
+        client: Optional[Any] = None,
+        worker_id: Optional[str] = None,
+        visibility_timeout: int = DEFAULT_VISIBILITY_TIMEOUT,
+        block_timeout: int = 5,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        deep_queue_threshold: Optional[int] = None,
+        flush_size: int = 32,
+        reclaim_interval: float = 30.0,
+    ):
+        """
+        Args:
+            queue_key: Redis list the backend pushes jobs onto
+            redis_url: used to build a pooled client when ``client`` is None
+            client: redis-py compatible client (e.g. fakeredis.FakeRedis)
+            worker_id: stable id for this worker; defaults to host:pid
+            visibility_timeout: seconds without a heartbeat before a worker's
+                in-flight jobs are handed back to the queue
+            block_timeout: seconds BLMOVE waits for a job
+            batch_size: max jobs taken per dequeue when the queue is deep
+            deep_queue_threshold: queue length at which dequeue batches;
+                defaults to batch_size
+            flush_size: buffered writes that trigger a pipeline flush
+            reclaim_interval: seconds between scans for dead workers
+        """
+        if client is None:
+            pool = redis.ConnectionPool.from_url(
+                redis_url or os.getenv("REDIS_URL", "redis://localhost:6379"),
+                max_connections=DEFAULT_MAX_CONNECTIONS,
+            )
+            client = redis.Redis(connection_pool=pool)
+
+        self.client = client
+        self.queue_key = queue_key
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.processing_key = f"{queue_key}:processing:{self.worker_id}"
+        self.heartbeat_key = f"{queue_key}:heartbeat:{self.worker_id}"
+        self.progress_key = f"{queue_key}:progress"
+        self.results_channel = f"{queue_key}:results"
+        self.visibility_timeout = visibility_timeout
+        self.block_timeout = block_timeout
+        self.batch_size = max(1, batch_size)
+        self.deep_queue_threshold = deep_queue_threshold or self.batch_size
+        self.flush_size = flush_size
+        self.reclaim_interval = reclaim_interval
+
+        # Jobs may be acked from several threads at once
+        self._lock = threading.RLock()
+        self._in_flight: Dict[str, bytes] = {}
+        self._buffer: List[Tuple[str, tuple, dict]] = []
+        self._last_reclaim = 0.0
+        self._last_heartbeat = 0.0
+
+    # --- Dequeue -----------------------------------------------------------
+
+    def dequeue(self, block: bool = True) -> List[Dict[str, Any]]:
+        """
+        Take the next job(s) off the queue, waiting up to block_timeout for
+        one to arrive unless ``block`` is False.
+
+        Returns a single job normally, or up to batch_size jobs when the queue
+        is at least deep_queue_threshold long. Every returned job has a unique
+        TOKEN_FIELD and an "id" (the token if the producer did not set one),
+        and stays on this worker's processing list until acked or requeued.
+        """
+        self.keepalive()
+
+        if block:
+            raw = self.client.blmove(
+                self.queue_key, self.processing_key, self.block_timeout, "LEFT", "RIGHT"
+            )
+        else:
+            raw = self.client.lmove(self.queue_key, self.processing_key, "LEFT", "RIGHT")
+        if raw is None:
+            return []
+
+        batch = [raw]
+        if self.batch_size > 1 and self.client.llen(self.queue_key) >= self.deep_queue_threshold:
+            pipe = self.client.pipeline(transaction=False)
+            for _ in range(self.batch_size - 1):
+                pipe.lmove(self.queue_key, self.processing_key, "LEFT", "RIGHT")
+            batch.extend(r for r in pipe.execute() if r is not None)
+
+        return self._track(batch)
+
+    def claim(
+        self,
+        predicate: Callable[[Dict[str, Any]], bool],
+        max_jobs: int,
+        scan_depth: int = 256,
+    ) -> List[Dict[str, Any]]:
+        """
+        Take queued jobs matching ``predicate`` out of order.
+
+        Only the first ``scan_depth`` entries are inspected. Each match is
+        pushed onto the processing list before it is removed from the queue, so
+        a crash in between can at worst run the job twice, never drop it.
+        """
+        if max_jobs <= 0:
+            return []
+
+        candidates = []
+        for raw in self.client.lrange(self.queue_key, 0, scan_depth - 1):
+            try:
+                job = json.loads(raw)
+            except ValueError:
+                continue
+            if predicate(job):
+                candidates.append(raw)
+                if len(candidates) >= max_jobs:
+                    break
+        if not candidates:
+            return []
+
+        pipe = self.client.pipeline(transaction=False)
+        for raw in candidates:
+            pipe.rpush(self.processing_key, raw)
+            pipe.lrem(self.queue_key, 1, raw)
+        removed = pipe.execute()[1::2]
+
+        claimed, lost = [], []
+        for raw, count in zip(candidates, removed):
+            (claimed if count else lost).append(raw)
+
+        # Another worker got there first: drop the copy we pushed
+        if lost:
+            pipe = self.client.pipeline(transaction=False)
+            for raw in lost:
+                pipe.lrem(self.processing_key, -1, raw)
+            pipe.execute()
+
+        return self._track(claimed)
+
+    def peek(self, count: int) -> List[Dict[str, Any]]:
+        """Return up to ``count`` jobs from the head of the queue without taking them"""
+        if count <= 0:
+            return []
+        jobs = []
+        for raw in self.client.lrange(self.queue_key, 0, count - 1):
+            try:
+                jobs.append(json.loads(raw))
+            except ValueError:
+                continue
+        return jobs
+
+    def _track(self, raws: List[bytes]) -> List[Dict[str, Any]]:
+        jobs = []
+        for raw in raws:
+            try:
+                job = json.loads(raw)
+            except ValueError:
+                logger.error(f"[Queue] Discarding malformed job: {raw[:200]!r}")
+                self.client.lrem(self.processing_key, 1, raw)
+                continue
+            if not isinstance(raw, bytes):
+                raw = raw.encode()
+            token = uuid.uuid4().hex
+            job[TOKEN_FIELD] = token
+            job.setdefault("id", token)
+            with self._lock:
+                self._in_flight[token] = raw
+            jobs.append(job)
+        return jobs
+
+    def in_flight(self, job: Dict[str, Any]) -> bool:
+        """True if ``job`` was handed out by this client and not yet acked or requeued"""
+        with self._lock:
+            return job.get(TOKEN_FIELD) in self._in_flight
+
+    # --- Buffered writes ---------------------------------------------------
+
+    def _queue_write(self, command: str, *args, **kwargs):
+        with self._lock:
+            self._buffer.append((command, args, kwargs))
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self.flush()
+
+    def heartbeat(self):
+        """Mark this worker alive for another visibility_timeout seconds"""
+        self._last_heartbeat = time.monotonic()
+        self._queue_write("set", self.heartbeat_key, int(time.time()), ex=self.visibility_timeout)
+        self.flush()
+
+    def keepalive(self):
+        """Heartbeat if a third of the visibility timeout has passed since the last one"""
+        if time.monotonic() - self._last_heartbeat >= self.visibility_timeout / 3:
+            self.heartbeat()
+
+    def report_progress(self, job: Dict[str, Any], progress: float):
+        """Buffer a progress update; sent with the next flush"""
+        self._queue_write("hset", self.progress_key, str(job["id"]), progress)
+
+    def ack(self, job: Dict[str, Any], result: Dict[str, Any]):
+        self.ack_many([(job, result)])
+
+    def ack_many(self, results: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """
+        Publish results and release the jobs from the processing list, along
+        with any buffered progress, in one pipeline.
+
+        The pipeline is this call's own rather than the shared buffer, so a
+        flush on another thread can never send (or lose) these writes. If it
+        fails the exception propagates and the jobs stay in flight, so the
+        caller can still requeue them.
+        """
+        with self._lock:
+            buffered, self._buffer = self._buffer, []
+            raws = [self._in_flight.get(job.get(TOKEN_FIELD)) for job, _ in results]
+
+        pipe = self.client.pipeline(transaction=False)
+        for command, args, kwargs in buffered:
+            getattr(pipe, command)(*args, **kwargs)
+        for (job, result), raw in zip(results, raws):
+            job_id = str(job["id"])
+            pipe.set(f"{RESULT_KEY_PREFIX}{job_id}", json.dumps(result), ex=RESULT_TTL_SECONDS)
+            pipe.hdel(self.progress_key, job_id)
+            if raw is not None:
+                pipe.lrem(self.processing_key, 1, raw)
+            pipe.publish(self.results_channel, job_id)
+        pipe.set(self.heartbeat_key, int(time.time()), ex=self.visibility_timeout)
+
+        try:
+            pipe.execute()
+        except Exception:
+            # Keep the progress updates that rode along for the next flush
+            with self._lock:
+                self._buffer[:0] = buffered
+            raise
+        self._last_heartbeat = time.monotonic()
+
+        with self._lock:
+            for job, _ in results:
+                self._in_flight.pop(job.get(TOKEN_FIELD), None)
+
+    def requeue(self, jobs: List[Dict[str, Any]]) -> int:
+        """
+        Hand in-flight jobs back to the head of the queue without a result,
+        e.g. when their result could not be written.
+
+        Returns:
+            number of jobs requeued
+        """
+        with self._lock:
+            entries = [
+                (job.get(TOKEN_FIELD), self._in_flight[job.get(TOKEN_FIELD)])
+                for job in jobs
+                if job.get(TOKEN_FIELD) in self._in_flight
+            ]
+        if not entries:
+            return 0
+
+        # Push before removing so a failure in between duplicates, never drops
+        pipe = self.client.pipeline(transaction=False)
+        for _, raw in entries:
+            pipe.lpush(self.queue_key, raw)
+            pipe.lrem(self.processing_key, 1, raw)
+        pipe.execute()
+
+        with self._lock:
+            for token, _ in entries:
+                self._in_flight.pop(token, None)
+        return len(entries)
+
+    def flush(self):
+        """Send all buffered writes in a single pipeline"""
+        with self._lock:
+            if not self._buffer:
+                return
+            buffered, self._buffer = self._buffer, []
+        pipe = self.client.pipeline(transaction=False)
+        for command, args, kwargs in buffered:
+            getattr(pipe, command)(*args, **kwargs)
+        pipe.execute()
+
+    # --- Recovery ----------------------------------------------------------
+
+    def recover(self) -> int:
+        """Requeue anything left on this worker's own processing list"""
+        return self._requeue(self.processing_key)
+
+    def maybe_reclaim(self) -> int:
+        """Run reclaim_expired at most once per reclaim_interval"""
+        now = time.monotonic()
+        if now - self._last_reclaim < self.reclaim_interval:
+            return 0
+        self._last_reclaim = now
+        return self.reclaim_expired()
+
+    def reclaim_expired(self) -> int:
+        """
+        Requeue in-flight jobs of workers whose heartbeat has expired.
+
+        Returns:
+            number of jobs pushed back onto the queue
+        """
+        prefix = f"{self.queue_key}:processing:"
+        keys = [
+            key.decode() if isinstance(key, bytes) else key
+            for key in self.client.scan_iter(match=f"{prefix}*")
+        ]
+        keys = [key for key in keys if key != self.processing_key]
+        if not keys:
+            return 0
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(f"{self.queue_key}:heartbeat:{key[len(prefix):]}")
+        alive = pipe.execute()
+
+        reclaimed = 0
+        for key, is_alive in zip(keys, alive):
+            if not is_alive:
+                count = self._requeue(key)
+                if count:
+                    logger.warning(f"[Queue] Reclaimed {count} job(s) from expired worker {key[len(prefix):]}")
+                reclaimed += count
+        return reclaimed
+
+    def _requeue(self, processing_key: str) -> int:
+        # Pop from the tail and push to the head so the jobs keep their order
+        # and run before anything enqueued since
+        count = 0
+        while self.client.lmove(processing_key, self.queue_key, "RIGHT", "LEFT") is not None:
+            count += 1
+        return count
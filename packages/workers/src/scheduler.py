@@ -0,0 +1,345 @@
+"""
+Job scheduler — orders dequeued jobs by type, priority and estimated cost.
+
+Everything arrives on one queue, so without scheduling a 30-second
+analyze_audio can sit behind several multi-minute lip_sync_post_process jobs.
+The worker therefore pulls jobs into a JobScheduler, which keeps one ready
+queue per job type and picks between them with weighted fair sharing:
+each type accumulates virtual time equal to the estimated cost of the work it
+has been given divided by its weight, and the type furthest behind goes next.
+Within a type, jobs run in priority order (lower number first, as in Bull).
+
+Admission is bounded by a memory budget so that two large video jobs are not
+co-scheduled into an OOM; a job bigger than the whole budget still runs, but
+only when nothing else is running.
+
+Queue wait and run latency are tracked per job type, logged periodically and
+exported through the metrics endpoint. Jobs are keyed by their delivery token
+rather than their id, since the backend can enqueue identical payloads.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .queue_client import job_data, job_token
+
+logger = logging.getLogger(__name__)
+
+# Share of worker time each job type gets when several are backlogged.
+# Short, user-facing stages get the most so the storyboard appears quickly.
+JOB_TYPE_WEIGHTS = {
+    "analyze_audio": 8.0,
+    "generate_scenes": 8.0,
+    "vocal_extraction": 4.0,
+    "forced_alignment": 4.0,
+    "quality_check": 2.0,
+    "generate_scene": 2.0,
+    "remix_scene": 2.0,
+    "lip_sync_post_process": 1.0,
+    "stitch_final": 1.0,
+    "assemble_project": 1.0,
+}
+DEFAULT_WEIGHT = 2.0
+
+AUDIO_JOB_TYPES = {"analyze_audio", "vocal_extraction", "forced_alignment"}
+VIDEO_JOB_TYPES = {"lip_sync_post_process", "quality_check", "stitch_final", "assemble_project"}
+
+# Defaults used when a job does not say how big its input is
+DEFAULT_AUDIO_SECONDS = 240.0
+DEFAULT_SAMPLE_RATE = 22050
+DEFAULT_VIDEO_SECONDS = 10.0
+DEFAULT_FPS = 24.0
+DEFAULT_WIDTH = 1280
+DEFAULT_HEIGHT = 720
+
+# Rough throughput used to turn input size into seconds of work, so audio and
+# video costs are comparable
+AUDIO_SAMPLES_PER_SECOND = 2.0e6
+VIDEO_PIXELS_PER_SECOND = 3.0e7
+
+# Resident memory per unit of input: float32 signal plus spectrogram/feature
+# copies for audio, a few decoded BGR frames in flight for video
+AUDIO_BYTES_PER_SAMPLE = 4 * 12
+VIDEO_FRAMES_IN_FLIGHT = 16
+BASE_JOB_MEMORY = 64 * 1024 ** 2
+
+DEFAULT_MEMORY_BUDGET = int(os.getenv("WORKER_MEMORY_BUDGET", str(4 * 1024 ** 3)))
+
+# How long a job that does not fit in memory may be bypassed by smaller ones
+# before admission stops until enough running work drains for it
+MAX_BYPASS_SECONDS = 60.0
+
+# Samples kept per job type for wait/latency percentiles
+STATS_WINDOW = 500
+
+
+class JobCost:
+    """Estimated work (seconds) and peak memory (bytes) of a job"""
+
+    def __init__(self, seconds: float, memory_bytes: int):
+        self.seconds = seconds
+        self.memory_bytes = memory_bytes
+
+    def __repr__(self) -> str:
+        return f"JobCost(seconds={self.seconds:.2f}, memory_bytes={self.memory_bytes})"
+
+
+def _duration(data: Dict[str, Any], default: float) -> float:
+    if data.get("duration"):
+        return float(data["duration"])
+    if data.get("endTime") is not None:
+        return max(0.0, float(data["endTime"]) - float(data.get("startTime", 0.0)))
+    return default
+
+
+def estimate_cost(job: Dict[str, Any]) -> JobCost:
+    """
+    Estimate a job's cost from its payload.
+
+    Audio jobs scale with duration x sample rate, video jobs with
+    frames x resolution; anything else is treated as a small fixed cost.
+    """
+    data = job_data(job)
+    job_type = job.get("type")
+
+    if job_type in AUDIO_JOB_TYPES:
+        samples = _duration(data, DEFAULT_AUDIO_SECONDS) * float(data.get("sampleRate", DEFAULT_SAMPLE_RATE))
+        return JobCost(
+            samples / AUDIO_SAMPLES_PER_SECOND,
+            BASE_JOB_MEMORY + int(samples * AUDIO_BYTES_PER_SAMPLE),
+        )
+
+    if job_type in VIDEO_JOB_TYPES:
+        fps = float(data.get("fps", DEFAULT_FPS))
+        frames = float(data.get("frames") or _duration(data, DEFAULT_VIDEO_SECONDS) * fps)
+        frame_pixels = int(data.get("width", DEFAULT_WIDTH)) * int(data.get("height", DEFAULT_HEIGHT))
+        return JobCost(
+            frames * frame_pixels / VIDEO_PIXELS_PER_SECOND,
+            BASE_JOB_MEMORY + frame_pixels * 3 * VIDEO_FRAMES_IN_FLIGHT,
+        )
+
+    return JobCost(1.0, BASE_JOB_MEMORY)
+
+
+def _job_priority(job: Dict[str, Any]) -> float:
+    priority = job.get("priority")
+    if priority is None:
+        priority = job_data(job).get("priority")
+    # Bull treats 1 as the highest priority and no priority as the lowest
+    return float(priority) if priority else float("inf")
+
+
+def _percentile(samples: Deque[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class JobScheduler:
+    """Weighted fair, memory-bounded scheduler over per-type ready queues"""
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        weights: Optional[Dict[str, float]] = None,
+        cost_fn: Callable[[Dict[str, Any]], JobCost] = estimate_cost,
+    ):
+        self.memory_budget = memory_budget
+        self.weights = dict(JOB_TYPE_WEIGHTS, **(weights or {}))
+        self.cost_fn = cost_fn
+
+        self._lock = threading.Lock()
+        self._ready: Dict[str, List] = defaultdict(list)
+        self._vtime: Dict[str, float] = defaultdict(float)
+        self._seq = itertools.count()
+        self._running: Dict[str, JobCost] = {}
+        self._memory_in_use = 0
+        self._blocked_since: Dict[str, float] = {}
+
+        self._submitted_at: Dict[str, float] = {}
+        self._started_at: Dict[str, float] = {}
+        self._waits: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=STATS_WINDOW))
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=STATS_WINDOW))
+        self._completed: Dict[str, int] = defaultdict(int)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(queue) for queue in self._ready.values())
+
+    @property
+    def running(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def submit(self, job: Dict[str, Any]):
+        """Add a dequeued job to its type's ready queue"""
+        job_type = job.get("type", "unknown")
+        cost = self.cost_fn(job)
+        with self._lock:
+            min_vtime = self._min_active_vtime()
+            if not self._ready[job_type] and min_vtime is not None:
+                # A type coming back from idle starts level with the others
+                # rather than spending credit it built up while it had no work
+                self._vtime[job_type] = max(self._vtime[job_type], min_vtime)
+            heapq.heappush(self._ready[job_type], (_job_priority(job), next(self._seq), job, cost))
+            self._submitted_at[job_token(job)] = self._enqueue_time(job)
+
+    def next(self) -> Optional[Dict[str, Any]]:
+        """
+        Pop the next job to run, or None if nothing is ready or nothing
+        ready fits in the memory left.
+        """
+        with self._lock:
+            backlogged = sorted(
+                (job_type for job_type, queue in self._ready.items() if queue),
+                key=lambda job_type: self._vtime[job_type],
+            )
+            now = time.time()
+            for job_type in backlogged:
+                _, _, job, cost = self._ready[job_type][0]
+                fits = self._memory_in_use + cost.memory_bytes <= self.memory_budget
+                if not fits and self._running:
+                    blocked_since = self._blocked_since.setdefault(job_token(job), now)
+                    if now - blocked_since > MAX_BYPASS_SECONDS:
+                        # Let running work drain so this job is not starved
+                        return None
+                    continue
+                self._blocked_since.pop(job_token(job), None)
+
+                heapq.heappop(self._ready[job_type])
+                self._vtime[job_type] += cost.seconds / self.weights.get(job_type, DEFAULT_WEIGHT)
+                self._admit(job, cost)
+                return job
+            return None
+
+    def take(self, predicate: Callable[[Dict[str, Any]], bool], max_jobs: int) -> List[Dict[str, Any]]:
+        """
+        Remove ready jobs matching ``predicate`` so they can run alongside a
+        job that was just scheduled (e.g. fused siblings). Their wait time is
+        recorded, but they share the scheduled job's memory admission.
+        """
+        taken = []
+        with self._lock:
+            for job_type, queue in self._ready.items():
+                keep = []
+                for entry in queue:
+                    if len(taken) < max_jobs and predicate(entry[2]):
+                        taken.append(entry[2])
+                    else:
+                        keep.append(entry)
+                if len(keep) != len(queue):
+                    heapq.heapify(keep)
+                    self._ready[job_type] = keep
+            now = time.time()
+            for job in taken:
+                self._record_start(job, now)
+        return taken
+
+    def record_started(self, jobs: List[Dict[str, Any]]):
+        """
+        Track jobs that run alongside a scheduled job without having been
+        submitted (e.g. fused siblings claimed straight from the queue), so
+        complete() counts their latency. Their wait is measured from the
+        Bull timestamp when there is one.
+        """
+        now = time.time()
+        with self._lock:
+            for job in jobs:
+                self._record_start(job, now)
+
+    def peek(self, count: int) -> List[Dict[str, Any]]:
+        """Return up to ``count`` ready jobs in roughly the order they will run"""
+        with self._lock:
+            entries = sorted(
+                (self._vtime[job_type], entry)
+                for job_type, queue in self._ready.items()
+                for entry in heapq.nsmallest(count, queue)
+            )
+        return [entry[2] for _, entry in entries[:count]]
+
+    def complete(self, job: Dict[str, Any], siblings: Optional[List[Dict[str, Any]]] = None):
+        """Release a finished job's memory and record its latency"""
+        now = time.time()
+        with self._lock:
+            cost = self._running.pop(job_token(job), None)
+            if cost is not None:
+                self._memory_in_use -= cost.memory_bytes
+            for finished in [job] + (siblings or []):
+                started = self._started_at.pop(job_token(finished), None)
+                if started is not None:
+                    job_type = finished.get("type", "unknown")
+                    self._latencies[job_type].append(now - started)
+                    self._completed[job_type] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per job type: completed count, queued count and wait/latency percentiles (seconds)"""
+        with self._lock:
+            job_types = set(self._waits) | set(self._ready)
+            return {
+                job_type: {
+                    "completed": self._completed[job_type],
+                    "queued": len(self._ready.get(job_type, ())),
+                    "wait_p50": _percentile(self._waits[job_type], 0.5),
+                    "wait_p95": _percentile(self._waits[job_type], 0.95),
+                    "latency_p50": _percentile(self._latencies[job_type], 0.5),
+                    "latency_p95": _percentile(self._latencies[job_type], 0.95),
+                }
+                for job_type in sorted(job_types)
+            }
+
+    def metric_samples(self) -> List[Tuple[str, str, str, Dict[str, str], float]]:
+        """stats() as (name, type, help, labels, value) for metrics.REGISTRY.add_collector"""
+        samples = []
+        for job_type, stats in self.stats().items():
+            samples.append(("worker_jobs_queued", "gauge", "Jobs waiting in the local scheduler",
+                            {"job_type": job_type}, stats["queued"]))
+            labels = {"job_type": job_type}
+            for quantile in ("p50", "p95"):
+                samples.append((f"worker_queue_wait_{quantile}_seconds", "gauge",
+                                f"Queue wait time per job type ({quantile} of recent jobs)",
+                                labels, stats[f"wait_{quantile}"]))
+                samples.append((f"worker_job_latency_{quantile}_seconds", "gauge",
+                                f"Run latency per job type ({quantile} of recent jobs)",
+                                labels, stats[f"latency_{quantile}"]))
+        return samples
+
+    def log_stats(self):
+        for job_type, stats in self.stats().items():
+            logger.info(
+                f"[Scheduler] {job_type}: completed={stats['completed']} queued={stats['queued']} "
+                f"wait p50/p95={stats['wait_p50']:.1f}/{stats['wait_p95']:.1f}s "
+                f"latency p50/p95={stats['latency_p50']:.1f}/{stats['latency_p95']:.1f}s"
+            )
+
+    # --- Internal (lock held) ----------------------------------------------
+
+    def _min_active_vtime(self) -> Optional[float]:
+        active = [self._vtime[job_type] for job_type, queue in self._ready.items() if queue]
+        return min(active) if active else None
+
+    def _admit(self, job: Dict[str, Any], cost: JobCost):
+        self._running[job_token(job)] = cost
+        self._memory_in_use += cost.memory_bytes
+        self._record_start(job, time.time())
+
+    def _record_start(self, job: Dict[str, Any], now: float):
+        key = job_token(job)
+        submitted = self._submitted_at.pop(key, None)
+        if submitted is None:
+            submitted = min(now, self._enqueue_time(job))
+        self._waits[job.get("type", "unknown")].append(max(0.0, now - submitted))
+        self._started_at[key] = now
+
+    @staticmethod
+    def _enqueue_time(job: Dict[str, Any]) -> float:
+        # Bull stamps jobs with a millisecond "timestamp"; otherwise the wait
+        # is measured from when this worker dequeued the job
+        timestamp = job.get("timestamp")
+        return float(timestamp) / 1000.0 if timestamp else time.time()
@@ -1,10 +1,16 @@
 import os
-import json
 import logging
-from typing import Any, Dict
-import redis
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List
 from dotenv import load_dotenv
 
+from . import metrics
+from .job_fusion import claim_sibling_jobs, is_fusible, run_fused_jobs
+from .prefetch import InputPrefetcher
+from .queue_client import QueueClient
+from .scheduler import JobScheduler
+
 load_dotenv()
 
 logging.basicConfig(
@@ -16,11 +22,22 @@ logger = logging.getLogger(__name__)
 
 # Redis connection
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
-redis_client = redis.from_url(REDIS_URL)
+WORKER_ID = os.getenv("WORKER_ID")
+
+# How many upcoming jobs to download inputs for while the current one runs
+PREFETCH_LOOKAHEAD = int(os.getenv("PREFETCH_LOOKAHEAD", "4"))
+
+# Jobs run concurrently on a thread pool, within the scheduler's memory budget
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+# Jobs pulled ahead into the local scheduler, so it can reorder across types
+SCHEDULER_BACKLOG = int(os.getenv("SCHEDULER_BACKLOG", "8"))
+STATS_LOG_INTERVAL = float(os.getenv("STATS_LOG_INTERVAL", "60"))
 
 # API endpoints
 BACKEND_API_BASE = os.getenv("BACKEND_API_BASE", "http://localhost:3000/api")
 
+_processors: Dict[str, type] = {}
+
 
 class JobProcessor:
     """Base class for job processors"""
@@ -32,28 +49,182 @@ class JobProcessor:
 
 def register_processor(job_type: str, processor_class: type):
     """Register a job processor"""
+    _processors[job_type] = processor_class
     logger.info(f"[Workers] Registered processor for job type: {job_type}")
 
 
+def process_job(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a single job through its registered processor"""
+    job_type = job_data.get("type")
+    processor_class = _processors.get(job_type)
+    if processor_class is None:
+        return {"success": False, "error": f"Unknown job type: {job_type}", "duration": 0}
+
+    started = time.perf_counter()
+    with metrics.track_job(job_data) as job_metrics:
+        try:
+            result = {"success": True, "data": processor_class().process(job_data)}
+        except Exception as e:
+            logger.error(f"[Workers] {job_type} failed: {e}")
+            result = {"success": False, "error": str(e)}
+    result["duration"] = int((time.perf_counter() - started) * 1000)
+    result["metrics"] = job_metrics.summary()
+    return result
+
+
+def handle_job(
+    job_data: Dict[str, Any],
+    queue_client: QueueClient,
+    prefetcher: InputPrefetcher,
+    scheduler: JobScheduler,
+) -> List[Dict[str, Any]]:
+    """
+    Process a scheduled job, fusing it with siblings that share its inputs.
+
+    Every job in the group leaves this worker's processing list: acked with
+    its result (a failure result if processing raised), or requeued if the
+    results could not be written.
+
+    Returns:
+        the sibling jobs that ran with it
+    """
+    group = [job_data]
+    if is_fusible(job_data):
+        group += claim_sibling_jobs(queue_client, job_data, scheduler)
+        if len(group) > 1:
+            logger.info(
+                f"[Workers] Fusing {len(group)} jobs for project {job_data.get('projectId')}: "
+                f"{', '.join(job.get('type') for job in group)}"
+            )
+
+    results, ready = [], []
+    try:
+        # Inputs are usually already on disk from an earlier prefetch()
+        for job in group:
+            try:
+                prefetcher.acquire(job)
+                ready.append(job)
+            except Exception as e:
+                logger.error(f"[Workers] Could not fetch inputs for {job.get('type')} ({job['id']}): {e}")
+                results.append((job, {"success": False, "error": f"Input download failed: {e}", "duration": 0}))
+
+        if ready and is_fusible(job_data):
+            results += run_fused_jobs(ready)
+        elif ready:
+            results.append((job_data, process_job(job_data)))
+    except Exception as e:
+        logger.error(f"[Workers] Error processing job {job_data['id']}: {e}")
+        finished = {id(job) for job, _ in results}
+        results += [
+            (job, {"success": False, "error": str(e), "duration": 0})
+            for job in group
+            if id(job) not in finished
+        ]
+    finally:
+        for job in ready:
+            prefetcher.release(job)
+
+    try:
+        queue_client.ack_many(results)
+    except Exception as e:
+        logger.error(f"[Workers] Could not publish results for job {job_data['id']}: {e}")
+        # A live worker's processing list is never reclaimed, so hand the
+        # jobs back rather than leave them there until a restart
+        requeued = queue_client.requeue(group)
+        logger.warning(f"[Workers] Requeued {requeued} job(s)")
+
+    return group[1:]
+
+
+def run_scheduled_job(
+    job_data: Dict[str, Any],
+    queue_client: QueueClient,
+    prefetcher: InputPrefetcher,
+    scheduler: JobScheduler,
+):
+    """Thread pool entry point: run a job and release its scheduler slot"""
+    siblings = []
+    try:
+        logger.info(f"[Workers] Running job: {job_data.get('type')} ({job_data['id']})")
+        siblings = handle_job(job_data, queue_client, prefetcher, scheduler)
+    except Exception as e:
+        logger.error(f"[Workers] Error processing job {job_data['id']}: {e}")
+        try:
+            if queue_client.in_flight(job_data):
+                queue_client.ack(job_data, {"success": False, "error": str(e), "duration": 0})
+        except Exception as ack_error:
+            logger.error(f"[Workers] Could not fail job {job_data['id']}: {ack_error}")
+    finally:
+        scheduler.complete(job_data, siblings)
+
+
+def prefetch_upcoming(
+    prefetcher: InputPrefetcher,
+    queue_client: QueueClient,
+    scheduler: JobScheduler,
+    lookahead: int = PREFETCH_LOOKAHEAD,
+):
+    """Start input downloads for the next jobs this worker is likely to run"""
+    upcoming = scheduler.peek(lookahead)
+    upcoming += queue_client.peek(lookahead - len(upcoming))
+    for job in upcoming:
+        prefetcher.prefetch(job)
+
+
 def listen_for_jobs(queue_key: str = "processing"):
     """Listen for new jobs from Redis queue"""
-    logger.info(f"[Workers] Listening for jobs on queue: {queue_key}")
+    queue_client = QueueClient(queue_key, redis_url=REDIS_URL, worker_id=WORKER_ID)
+    prefetcher = InputPrefetcher(api_base=BACKEND_API_BASE)
+    scheduler = JobScheduler()
+    metrics.REGISTRY.add_collector(scheduler.metric_samples)
+    metrics.start_metrics_server()
+    executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="job")
+    running = set()
+    last_stats_log = time.monotonic()
+
+    recovered = queue_client.recover()
+    if recovered:
+        logger.info(f"[Workers] Requeued {recovered} job(s) left over from a previous run")
+
+    logger.info(f"[Workers] Listening for jobs on queue: {queue_key} as {queue_client.worker_id}")
 
     while True:
         try:
-            # BLPOP blocks until an item is available
-            result = redis_client.blpop(queue_key, timeout=5)
-            if result:
-                queue_name, job_json = result
-                job_data = json.loads(job_json)
-                logger.info(f"[Workers] Received job: {job_data.get('type')}")
+            queue_client.keepalive()
+            queue_client.maybe_reclaim()
+
+            # Keep a local backlog to schedule from. BLMOVE only blocks when
+            # there is nothing else to do; a deep queue yields a batch.
+            while len(scheduler) < SCHEDULER_BACKLOG:
+                idle = not running and not len(scheduler)
+                jobs = queue_client.dequeue(block=idle)
+                for job_data in jobs:
+                    logger.info(f"[Workers] Received job: {job_data.get('type')} ({job_data['id']})")
+                    scheduler.submit(job_data)
+                if not jobs:
+                    break
+
+            while len(running) < WORKER_CONCURRENCY:
+                job_data = scheduler.next()
+                if job_data is None:
+                    break
+                prefetcher.prefetch(job_data)
+                running.add(executor.submit(run_scheduled_job, job_data, queue_client, prefetcher, scheduler))
+
+            prefetch_upcoming(prefetcher, queue_client, scheduler)
+
+            if running:
+                done, running = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
 
-                # Route to appropriate processor
-                job_type = job_data.get("type")
-                # Process based on type (would be implemented with actual processors)
+            if time.monotonic() - last_stats_log >= STATS_LOG_INTERVAL:
+                scheduler.log_stats()
+                last_stats_log = time.monotonic()
 
         except KeyboardInterrupt:
             logger.info("[Workers] Shutting down...")
+            executor.shutdown(wait=True)
+            prefetcher.close()
             break
         except Exception as e:
-            logger.error(f"[Workers] Error processing job: {e}")
+            logger.error(f"[Workers] Error in worker loop: {e}")
+            time.sleep(1)
@@ -0,0 +1,172 @@
+import json
+import os
+
+import fakeredis
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src import job_fusion
+from src.job_fusion import claim_sibling_jobs, run_fused_jobs
+from src.queue_client import QueueClient
+from src.scheduler import JobScheduler
+
+SR = 22050
+DURATION = 8.0
+
+
+@pytest.fixture
+def audio_path(tmp_path):
+    t = np.arange(int(DURATION * SR)) / SR
+    y = 0.3 * np.sin(2 * np.pi * 220 * t)
+    # A click every half second so beat tracking has something to find
+    y[(np.arange(len(t)) % (SR // 2)) < 200] += 0.5
+    path = tmp_path / "song.wav"
+    sf.write(str(path), y.astype(np.float32), SR)
+    return str(path)
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    work_dir = tmp_path / "work"
+    monkeypatch.setattr(job_fusion, "WORK_DIR", str(work_dir))
+    return work_dir
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+    real_load_audio = job_fusion.load_audio
+
+    def load_audio(path, sr=SR):
+        calls.append(path)
+        return real_load_audio(path, sr=sr)
+
+    monkeypatch.setattr(job_fusion, "load_audio", load_audio)
+    return calls
+
+
+def project_jobs(audio_path):
+    return [
+        {"id": "align", "type": "forced_alignment", "projectId": "p", "sceneId": "s",
+         "data": {"vocalSegmentId": "v", "lyricExcerpt": "one two three four"}},
+        {"id": "extract", "type": "vocal_extraction", "projectId": "p", "sceneId": "s",
+         "data": {"audioPath": audio_path, "startTime": 2.0, "endTime": 6.0}},
+        {"id": "analyze", "type": "analyze_audio", "projectId": "p", "data": {"audioPath": audio_path}},
+    ]
+
+
+def test_group_decodes_once_and_runs_in_dag_order(audio_path, work_dir, decodes):
+    results = run_fused_jobs(project_jobs(audio_path))
+
+    assert decodes == [audio_path]
+    assert [job["id"] for job, _ in results] == ["analyze", "extract", "align"]
+    for _, result in results:
+        assert result["success"], result.get("error")
+        assert "duration" in result and "metrics" in result
+
+
+def test_each_job_gets_its_own_result(audio_path, work_dir, decodes):
+    results = dict((job["id"], result["data"]) for job, result in run_fused_jobs(project_jobs(audio_path)))
+
+    assert results["analyze"]["duration"] == pytest.approx(DURATION, abs=0.05)
+    assert results["analyze"]["beats"]
+    assert results["extract"]["duration"] == pytest.approx(4.0, abs=0.01)
+    assert [word["text"] for word in results["align"]["words"]] == ["one", "two", "three", "four"]
+
+
+def test_alignment_reuses_extracted_segment(audio_path, work_dir, decodes):
+    results = dict((job["id"], result) for job, result in run_fused_jobs(project_jobs(audio_path)))
+
+    # Aligned over the 4 s scene segment, without decoding any vocals file
+    assert results["align"]["data"]["words"][-1]["end_time"] == pytest.approx(4.0, abs=0.01)
+    assert decodes == [audio_path]
+
+
+def test_extraction_writes_its_own_segment_file(audio_path, work_dir, decodes):
+    results = dict((job["id"], result["data"]) for job, result in run_fused_jobs(project_jobs(audio_path)))
+
+    segment_path = work_dir / "p" / "s" / "vocal_segment.wav"
+    assert results["extract"]["segmentPath"] == str(segment_path)
+    y, sr = sf.read(str(segment_path))
+    assert sr == SR and len(y) == int(4.0 * SR)
+    # The backend's vocals.wav is left alone
+    assert not (work_dir / "p" / "s" / "vocals.wav").exists()
+
+
+def test_alignment_alone_reads_backend_vocals(audio_path, work_dir, decodes):
+    vocals = work_dir / "p" / "s" / "vocals.wav"
+    vocals.parent.mkdir(parents=True)
+    sf.write(str(vocals), np.zeros(3 * SR, dtype=np.float32), SR)
+
+    [(_, result)] = run_fused_jobs([project_jobs(audio_path)[0]])
+
+    assert result["success"]
+    assert decodes == [str(vocals)]
+    assert result["data"]["words"][-1]["end_time"] == pytest.approx(3.0, abs=0.01)
+
+
+def test_failed_alignment_is_reported_as_failure(audio_path, work_dir, decodes):
+    # No vocals.wav for the scene and no extraction in the group
+    [(_, result)] = run_fused_jobs([project_jobs(audio_path)[0]])
+
+    assert result["success"] is False
+    assert result["error"]
+
+
+def test_alignment_error_is_not_published_as_success(audio_path, work_dir, decodes, monkeypatch):
+    # detect_phonemes_and_words catches its own errors and returns empty arrays
+    from src import audio_analysis
+
+    def broken_duration(*args, **kwargs):
+        raise ValueError("alignment broke")
+
+    jobs = project_jobs(audio_path)[:2]
+    monkeypatch.setattr(audio_analysis.librosa, "get_duration", broken_duration)
+
+    results = dict((job["id"], result) for job, result in run_fused_jobs(jobs))
+
+    assert results["align"]["success"] is False
+    assert results["align"]["error"] == "alignment broke"
+
+
+def test_one_failing_job_does_not_fail_the_group(audio_path, work_dir, decodes):
+    jobs = project_jobs(audio_path)
+    jobs.append({"id": "broken", "type": "analyze_audio", "projectId": "p", "data": {}})
+
+    results = dict((job["id"], result) for job, result in run_fused_jobs(jobs))
+
+    assert results["broken"]["success"] is False
+    assert all(results[job_id]["success"] for job_id in ("analyze", "extract", "align"))
+
+
+def test_claim_sibling_jobs_from_scheduler_and_queue():
+    redis_client = fakeredis.FakeRedis()
+    queue_client = QueueClient("processing", client=redis_client, worker_id="w1", block_timeout=1)
+    scheduler = JobScheduler()
+    scheduler.submit({"id": "local", "type": "forced_alignment", "projectId": "p"})
+    scheduler.submit({"id": "other-project", "type": "vocal_extraction", "projectId": "q"})
+    for job in (
+        {"id": "queued", "type": "vocal_extraction", "projectId": "p"},
+        {"id": "not-fusible", "type": "lip_sync_post_process", "projectId": "p"},
+        {"id": "queued-other", "type": "analyze_audio", "projectId": "q"},
+    ):
+        redis_client.rpush("processing", json.dumps(job))
+
+    job = {"id": "main", "type": "analyze_audio", "projectId": "p"}
+    siblings = claim_sibling_jobs(queue_client, job, scheduler)
+
+    assert [sibling["id"] for sibling in siblings] == ["local", "queued"]
+    assert len(scheduler) == 1
+    assert redis_client.llen("processing") == 2
+
+
+def test_claim_sibling_jobs_respects_max_jobs():
+    redis_client = fakeredis.FakeRedis()
+    queue_client = QueueClient("processing", client=redis_client, worker_id="w1", block_timeout=1)
+    for i in range(5):
+        redis_client.rpush("processing", json.dumps({"id": str(i), "type": "forced_alignment", "projectId": "p"}))
+
+    siblings = claim_sibling_jobs(queue_client, {"id": "main", "type": "analyze_audio", "projectId": "p"}, max_jobs=3)
+
+    assert len(siblings) == 2
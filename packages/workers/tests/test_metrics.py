@@ -0,0 +1,149 @@
+import socket
+import threading
+import urllib.request
+
+import pytest
+
+from src import metrics, worker
+from src.metrics import MetricsRegistry
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.describe("jobs_total", "counter", "Jobs done")
+    registry.describe("stage_seconds", "summary", "Stage time")
+    registry.inc("jobs_total", job_type="analyze_audio")
+    registry.inc("jobs_total", 2, job_type="analyze_audio")
+    registry.observe("stage_seconds", 0.25, stage="decode")
+    registry.observe("stage_seconds", 0.5, stage="decode")
+    registry.set("temperature", 1.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP jobs_total Jobs done",
+        "# TYPE jobs_total counter",
+        'jobs_total{job_type="analyze_audio"} 3',
+        "# HELP stage_seconds Stage time",
+        "# TYPE stage_seconds summary",
+        'stage_seconds_count{stage="decode"} 2',
+        'stage_seconds_sum{stage="decode"} 0.75',
+        "temperature 1.5",
+    ]
+
+
+def test_render_escapes_labels_and_survives_broken_collectors():
+    registry = MetricsRegistry()
+    registry.set("info", 1, path='a "b"\\c')
+
+    def broken():
+        raise RuntimeError("collector failed")
+
+    registry.add_collector(broken)
+    registry.add_collector(lambda: [("queued", "gauge", "Queued jobs", {"job_type": "x"}, 4)])
+
+    lines = registry.render().splitlines()
+    assert 'info{path="a \\"b\\"\\\\c"} 1' in lines
+    assert "# TYPE queued gauge" in lines
+    assert 'queued{job_type="x"} 4' in lines
+
+
+def test_track_job_binds_stage_and_count_per_thread():
+    barrier = threading.Barrier(2)
+    summaries = {}
+
+    def run(job_id, units):
+        with metrics.track_job({"id": job_id, "type": "analyze_audio"}) as job_metrics:
+            barrier.wait()
+            with metrics.stage("decode"):
+                metrics.count("samples", units)
+            barrier.wait()
+        summaries[job_id] = job_metrics.summary()
+
+    threads = [threading.Thread(target=run, args=(job_id, units)) for job_id, units in (("a", 100), ("b", 7))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert summaries["a"]["samples"] == 100
+    assert summaries["b"]["samples"] == 7
+    assert set(summaries["a"]["stages"]) == {"decode"}
+    assert metrics.current_job() is None
+
+
+def test_stage_and_count_outside_a_job_only_update_registry():
+    with metrics.stage("decode"):
+        metrics.count("frames", 3)
+
+    assert 'worker_frames_processed_total{job_type="none"}' in metrics.REGISTRY.render()
+
+
+class CountingProcessor(worker.JobProcessor):
+    def process(self, job_data):
+        with metrics.stage("decode"):
+            metrics.count("samples", 22050)
+        with metrics.stage("encode"):
+            pass
+        return {"ok": True}
+
+
+def test_process_job_attaches_metrics_block(monkeypatch):
+    monkeypatch.setitem(worker._processors, "analyze_audio", CountingProcessor)
+
+    result = worker.process_job({"id": "a", "type": "analyze_audio"})
+
+    assert result["success"] and result["data"] == {"ok": True}
+    block = result["metrics"]
+    assert set(block["stages"]) == {"decode", "encode"}
+    assert block["samples"] == 22050
+    assert block["samplesPerSecond"] > 0
+    assert block["peakRssBytes"] > 0
+    assert block["seconds"] >= 0
+    assert "profile" not in block
+
+
+def test_profiling_opt_in_per_job(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "PROFILE_MODE", "cprofile")
+
+    with metrics.track_job({"id": "p", "type": "analyze_audio", "data": {"profile": True}}) as job_metrics:
+        sum(i * i for i in range(10000))
+
+    profile = job_metrics.summary()["profile"]
+    assert profile["mode"] == "cprofile"
+    assert (tmp_path / "analyze_audio-p.prof").exists()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_metrics_server_serves_registry():
+    server = metrics.start_metrics_server(free_port())
+    try:
+        host, port = server.server_address
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            body = response.read().decode()
+        assert "worker_process_resident_bytes" in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://{host}:{port}/other", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_metrics_server_disabled_on_port_zero():
+    assert metrics.start_metrics_server(0) is None
+
+
+def test_metrics_server_port_taken_does_not_raise(caplog):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+
+        assert metrics.start_metrics_server(port) is None
+
+    assert "Could not serve metrics" in caplog.text
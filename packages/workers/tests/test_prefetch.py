@@ -0,0 +1,275 @@
+import concurrent.futures
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.prefetch import InputPrefetcher
+
+KB = 1024
+
+
+class CountingHandler(SimpleHTTPRequestHandler):
+    """Serves files from the fixture directory, counting and optionally delaying GETs"""
+
+    requests = []
+    delay = 0.0
+
+    def do_GET(self):
+        type(self).requests.append(self.path)
+        time.sleep(type(self).delay)
+        if self.path == "/unsized.wav":
+            self._send_unsized(body=True)
+        else:
+            super().do_GET()
+
+    def do_HEAD(self):
+        if self.path == "/unsized.wav":
+            self._send_unsized(body=False)
+        else:
+            super().do_HEAD()
+
+    def _send_unsized(self, body):
+        # HTTP/1.0 response delimited by closing the connection, with no Content-Length
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.end_headers()
+        if body:
+            self.wfile.write(os.urandom(40 * KB))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "served"
+    root.mkdir()
+    for name, size in {"a.wav": 200, "b.wav": 200, "c.wav": 200, "d.mp4": 200, "small.wav": 40}.items():
+        (root / name).write_bytes(os.urandom(size * KB))
+
+    handler = type("Handler", (CountingHandler,), {"requests": [], "delay": 0.0})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), lambda *args: handler(*args, directory=str(root)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def make_prefetcher(tmp_path):
+    created = []
+
+    def make(**kwargs):
+        prefetcher = InputPrefetcher(work_dir=str(tmp_path / "work"), **kwargs)
+        created.append(prefetcher)
+        return prefetcher
+
+    yield make
+    for prefetcher in created:
+        prefetcher.close()
+
+
+def job(**data):
+    return {"id": "j", "type": "lip_sync_post_process", "data": data}
+
+
+def staged_bytes(prefetcher):
+    return sum(
+        os.path.getsize(os.path.join(prefetcher.work_dir, name))
+        for name in os.listdir(prefetcher.work_dir)
+    )
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_acquire_downloads_and_sets_local_paths(server, make_prefetcher):
+    base, _ = server
+    prefetcher = make_prefetcher()
+    j = job(audioUrl=f"{base}/a.wav", videoUrl=f"{base}/d.mp4")
+
+    paths = prefetcher.acquire(j, timeout=10)
+
+    assert os.path.getsize(paths["audioPath"]) == 200 * KB
+    assert j["data"]["audioPath"] == paths["audioPath"]
+    assert j["data"]["videoPath"] == paths["videoPath"]
+    prefetcher.release(j)
+
+
+def test_identical_urls_are_downloaded_once(server, make_prefetcher):
+    base, handler = server
+    handler.delay = 0.2
+    prefetcher = make_prefetcher()
+    jobs = [job(audioUrl=f"{base}/a.wav") for _ in range(3)]
+
+    for j in jobs:
+        prefetcher.prefetch(j)
+    with concurrent.futures.ThreadPoolExecutor(3) as pool:
+        paths = list(pool.map(lambda j: prefetcher.acquire(j, timeout=10)["audioPath"], jobs))
+
+    assert handler.requests == ["/a.wav"]
+    assert len(set(paths)) == 1
+
+
+def test_relative_urls_resolve_against_api_base(server, make_prefetcher):
+    base, handler = server
+    prefetcher = make_prefetcher(api_base=f"{base}/")
+
+    prefetcher.acquire(job(audioUrl="small.wav"), timeout=10)
+
+    assert handler.requests == ["/small.wav"]
+
+
+def test_skipped_prefetch_is_not_retried_every_pass(server, make_prefetcher):
+    base, handler = server
+    prefetcher = make_prefetcher(max_bytes=100 * KB)
+
+    for _ in range(10):
+        prefetcher.prefetch(job(audioUrl=f"{base}/a.wav"))
+        time.sleep(0.02)
+    time.sleep(0.2)
+
+    # Too big for the budget: sized with HEAD, never requested
+    assert handler.requests == []
+    assert staged_bytes(prefetcher) == 0
+
+    # A job that needs it still gets it
+    prefetcher.acquire(job(audioUrl=f"{base}/a.wav"), timeout=10)
+    assert handler.requests == ["/a.wav"]
+
+
+def test_failed_prefetch_backs_off(server, make_prefetcher):
+    base, handler = server
+    prefetcher = make_prefetcher()
+
+    for _ in range(10):
+        prefetcher.prefetch(job(audioUrl=f"{base}/missing.wav"))
+        time.sleep(0.02)
+    time.sleep(0.2)
+
+    assert handler.requests == []
+    assert "missing.wav" in next(iter(prefetcher._backoff))
+
+
+def test_failed_download_backs_off_prefetch(server, make_prefetcher):
+    base, handler = server
+    prefetcher = make_prefetcher()
+
+    with pytest.raises(Exception):
+        prefetcher.acquire(job(audioUrl=f"{base}/missing.wav"), timeout=10)
+    for _ in range(5):
+        prefetcher.prefetch(job(audioUrl=f"{base}/missing.wav"))
+    time.sleep(0.2)
+
+    assert handler.requests == ["/missing.wav"]
+
+
+def test_unknown_size_is_not_prefetched(server, make_prefetcher):
+    base, handler = server
+    prefetcher = make_prefetcher()
+
+    prefetcher.prefetch(job(audioUrl=f"{base}/unsized.wav"))
+    time.sleep(0.3)
+    assert handler.requests == []
+
+    paths = prefetcher.acquire(job(audioUrl=f"{base}/unsized.wav"), timeout=10)
+    assert os.path.getsize(paths["audioPath"]) == 40 * KB
+
+
+def test_file_urls_are_used_in_place(tmp_path, make_prefetcher):
+    local = tmp_path / "vocals.wav"
+    local.write_bytes(b"RIFF")
+    prefetcher = make_prefetcher()
+
+    paths = prefetcher.acquire(job(audioUrl=f"file://{local}"), timeout=10)
+
+    assert paths["audioPath"] == str(local)
+
+
+def test_prefetches_stay_within_budget(server, make_prefetcher):
+    base, handler = server
+    prefetcher = make_prefetcher(max_bytes=250 * KB)
+
+    for name in ("a.wav", "b.wav", "c.wav", "d.mp4"):
+        prefetcher.prefetch(job(audioUrl=f"{base}/{name}"))
+    assert wait_for(lambda: len(handler.requests) >= 1)
+    time.sleep(0.5)
+
+    assert staged_bytes(prefetcher) <= 250 * KB
+
+
+def test_unpinned_files_are_evicted_lru(server, make_prefetcher):
+    base, _ = server
+    prefetcher = make_prefetcher(max_bytes=450 * KB)
+    first, second, third = (job(audioUrl=f"{base}/{name}") for name in ("a.wav", "b.wav", "c.wav"))
+
+    for j in (first, second):
+        prefetcher.acquire(j, timeout=10)
+        prefetcher.release(j)
+    first_path = first["data"]["audioPath"]
+    prefetcher.acquire(third, timeout=10)
+
+    assert not os.path.exists(first_path)
+    assert os.path.exists(second["data"]["audioPath"])
+    assert staged_bytes(prefetcher) <= 450 * KB
+
+
+def test_pinned_files_are_not_evicted(server, make_prefetcher):
+    base, _ = server
+    prefetcher = make_prefetcher(max_bytes=250 * KB)
+    held = job(audioUrl=f"{base}/a.wav")
+    prefetcher.acquire(held, timeout=10)
+
+    prefetcher.acquire(job(audioUrl=f"{base}/b.wav"), timeout=10)
+
+    assert os.path.exists(held["data"]["audioPath"])
+
+
+def test_job_inputs_larger_than_budget_do_not_hang(server, make_prefetcher):
+    base, _ = server
+    prefetcher = make_prefetcher(max_bytes=100 * KB)
+    j = job(audioUrl=f"{base}/a.wav", videoUrl=f"{base}/d.mp4")
+
+    paths = prefetcher.acquire(j, timeout=10)
+
+    assert os.path.exists(paths["audioPath"]) and os.path.exists(paths["videoPath"])
+    prefetcher.release(j)
+    assert staged_bytes(prefetcher) <= 100 * KB
+
+
+def test_failed_download_unpins_and_cleans_up(server, make_prefetcher):
+    base, _ = server
+    prefetcher = make_prefetcher(max_bytes=250 * KB)
+    j = job(audioUrl=f"{base}/a.wav", videoUrl=f"{base}/missing.mp4")
+
+    with pytest.raises(Exception):
+        prefetcher.acquire(j, timeout=10)
+
+    assert not any(name.endswith(".part") for name in os.listdir(prefetcher.work_dir))
+    # a.wav was pinned then unpinned, so it can make way for b.wav
+    prefetcher.acquire(job(audioUrl=f"{base}/b.wav"), timeout=10)
+    assert staged_bytes(prefetcher) <= 250 * KB
+
+
+def test_acquire_times_out_and_unpins(server, make_prefetcher):
+    base, handler = server
+    prefetcher = make_prefetcher(max_bytes=250 * KB)
+    prefetcher.acquire(job(audioUrl=f"{base}/small.wav"), timeout=10)
+    handler.delay = 1.0
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        prefetcher.acquire(job(audioUrl=f"{base}/small.wav", videoUrl=f"{base}/d.mp4"), timeout=0.3)
+
+    assert wait_for(lambda: all(staged.refs <= 1 for staged in list(prefetcher._staged.values())))
+    small = next(s for url, s in prefetcher._staged.items() if url.endswith("small.wav"))
+    assert small.refs == 1
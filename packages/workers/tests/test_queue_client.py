@@ -0,0 +1,272 @@
+import json
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from src.queue_client import RESULT_KEY_PREFIX, TOKEN_FIELD, QueueClient
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+def make_client(redis_client, worker_id="w1", **kwargs):
+    return QueueClient("processing", client=redis_client, worker_id=worker_id, block_timeout=1, **kwargs)
+
+
+def push(redis_client, *jobs):
+    for job in jobs:
+        redis_client.rpush("processing", json.dumps(job))
+
+
+def test_dequeue_moves_job_to_processing_list(redis_client):
+    push(redis_client, {"id": "a", "type": "analyze_audio"})
+    client = make_client(redis_client)
+
+    jobs = client.dequeue()
+
+    assert [job["id"] for job in jobs] == ["a"]
+    assert redis_client.llen("processing") == 0
+    assert redis_client.llen(client.processing_key) == 1
+    assert redis_client.exists(client.heartbeat_key)
+
+
+def test_dequeue_batches_when_queue_is_deep(redis_client):
+    push(redis_client, *({"id": str(i)} for i in range(10)))
+    client = make_client(redis_client, batch_size=4, deep_queue_threshold=4)
+
+    jobs = client.dequeue()
+
+    assert [job["id"] for job in jobs] == ["0", "1", "2", "3"]
+    assert redis_client.llen("processing") == 6
+
+
+def test_dequeue_empty_queue_without_blocking(redis_client):
+    assert make_client(redis_client).dequeue(block=False) == []
+
+
+def test_ack_publishes_result_and_releases_job(redis_client):
+    push(redis_client, {"id": "a"})
+    client = make_client(redis_client)
+    pubsub = redis_client.pubsub()
+    pubsub.subscribe(client.results_channel)
+    pubsub.get_message(timeout=1)
+
+    job = client.dequeue()[0]
+    client.report_progress(job, 50)
+    client.ack(job, {"success": True, "duration": 1})
+
+    assert json.loads(redis_client.get(f"{RESULT_KEY_PREFIX}a")) == {"success": True, "duration": 1}
+    assert redis_client.ttl(f"{RESULT_KEY_PREFIX}a") > 0
+    assert redis_client.llen(client.processing_key) == 0
+    assert not redis_client.hexists(client.progress_key, "a")
+    assert pubsub.get_message(timeout=1)["data"] == b"a"
+    assert not client.in_flight(job)
+
+
+def test_duplicate_payloads_are_tracked_separately(redis_client):
+    # The backend enqueues numTakes identical generate_scene payloads
+    payload = {"projectId": "p", "sceneId": "s", "type": "generate_scene"}
+    push(redis_client, payload, payload)
+    client = make_client(redis_client)
+
+    first = client.dequeue()[0]
+    second = client.dequeue()[0]
+
+    assert first[TOKEN_FIELD] != second[TOKEN_FIELD]
+    assert first["id"] != second["id"]
+
+    client.ack_many([(first, {"success": True, "duration": 1}), (second, {"success": False, "duration": 2})])
+
+    assert redis_client.llen(client.processing_key) == 0
+    assert redis_client.exists(f"{RESULT_KEY_PREFIX}{first['id']}")
+    assert redis_client.exists(f"{RESULT_KEY_PREFIX}{second['id']}")
+    assert client.recover() == 0
+
+
+def test_claim_takes_matching_jobs_out_of_order(redis_client):
+    push(
+        redis_client,
+        {"id": "a", "projectId": "p1"},
+        {"id": "b", "projectId": "p2"},
+        {"id": "c", "projectId": "p1"},
+    )
+    client = make_client(redis_client)
+
+    claimed = client.claim(lambda job: job.get("projectId") == "p1", max_jobs=5)
+
+    assert [job["id"] for job in claimed] == ["a", "c"]
+    assert [json.loads(raw)["id"] for raw in redis_client.lrange("processing", 0, -1)] == ["b"]
+    assert redis_client.llen(client.processing_key) == 2
+    assert all(client.in_flight(job) for job in claimed)
+
+
+def test_claim_duplicate_payloads(redis_client):
+    payload = {"projectId": "p", "type": "forced_alignment"}
+    push(redis_client, payload, payload, {"projectId": "other"})
+    client = make_client(redis_client)
+
+    claimed = client.claim(lambda job: job.get("projectId") == "p", max_jobs=5)
+    assert len(claimed) == 2
+    assert redis_client.llen("processing") == 1
+
+    client.ack_many([(job, {"success": True, "duration": 0}) for job in claimed])
+    assert redis_client.llen(client.processing_key) == 0
+
+
+def test_claim_respects_max_jobs(redis_client):
+    push(redis_client, *({"id": str(i), "projectId": "p"} for i in range(5)))
+    client = make_client(redis_client)
+
+    assert len(client.claim(lambda job: True, max_jobs=2)) == 2
+    assert redis_client.llen("processing") == 3
+
+
+def test_requeue_returns_job_to_queue_head(redis_client):
+    push(redis_client, {"id": "a"}, {"id": "b"})
+    client = make_client(redis_client)
+    job = client.dequeue()[0]
+
+    assert client.requeue([job]) == 1
+
+    assert redis_client.llen(client.processing_key) == 0
+    assert [json.loads(raw)["id"] for raw in redis_client.lrange("processing", 0, -1)] == ["a", "b"]
+    assert client.requeue([job]) == 0
+
+
+def fail_pipelines(monkeypatch, redis_client):
+    """Make every pipeline the client opens fail on execute"""
+    real_pipeline = redis_client.pipeline
+
+    def pipeline(*args, **kwargs):
+        pipe = real_pipeline(*args, **kwargs)
+
+        def execute(*_args, **_kwargs):
+            raise ConnectionError("redis down")
+
+        pipe.execute = execute
+        return pipe
+
+    monkeypatch.setattr(redis_client, "pipeline", pipeline)
+
+
+def test_failed_ack_keeps_job_in_flight(redis_client, monkeypatch):
+    push(redis_client, {"id": "a"})
+    client = make_client(redis_client)
+    job = client.dequeue()[0]
+    client.report_progress(job, 50)
+
+    fail_pipelines(monkeypatch, redis_client)
+    with pytest.raises(ConnectionError):
+        client.ack(job, {"success": True, "duration": 0})
+    monkeypatch.undo()
+
+    assert client.in_flight(job)
+    assert client.requeue([job]) == 1
+    # The progress update that rode along is kept for the next flush
+    client.flush()
+    assert redis_client.hget(client.progress_key, "a") == b"50"
+
+
+def test_concurrent_acks_each_see_their_own_failure(redis_client, monkeypatch):
+    push(redis_client, {"id": "a"}, {"id": "b"})
+    client = make_client(redis_client)
+    jobs = [client.dequeue()[0], client.dequeue()[0]]
+
+    fail_pipelines(monkeypatch, redis_client)
+    barrier = threading.Barrier(3)
+    errors = {}
+
+    def ack(job):
+        barrier.wait()
+        try:
+            client.ack(job, {"success": True, "duration": 0})
+        except ConnectionError as e:
+            errors[job["id"]] = e
+
+    def heartbeat():
+        barrier.wait()
+        try:
+            client.heartbeat()
+        except ConnectionError:
+            pass
+
+    threads = [threading.Thread(target=ack, args=(job,)) for job in jobs] + [threading.Thread(target=heartbeat)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    monkeypatch.undo()
+
+    assert set(errors) == {"a", "b"}
+    assert all(client.in_flight(job) for job in jobs)
+    assert client.requeue(jobs) == 2
+    assert redis_client.llen(client.processing_key) == 0
+    assert sorted(json.loads(raw)["id"] for raw in redis_client.lrange("processing", 0, -1)) == ["a", "b"]
+
+
+def test_dequeue_heartbeats_only_when_due(redis_client, monkeypatch):
+    client = make_client(redis_client)
+    client.dequeue(block=False)
+    beats = []
+    monkeypatch.setattr(client, "heartbeat", lambda: beats.append(1))
+
+    for _ in range(5):
+        client.dequeue(block=False)
+
+    assert beats == []
+
+
+def test_recover_requeues_own_processing_list(redis_client):
+    push(redis_client, {"id": "a"}, {"id": "b"})
+    make_client(redis_client).dequeue()
+    make_client(redis_client).dequeue()
+
+    restarted = make_client(redis_client)
+    assert restarted.recover() == 2
+    assert [json.loads(raw)["id"] for raw in redis_client.lrange("processing", 0, -1)] == ["a", "b"]
+
+
+def test_reclaim_expired_worker(redis_client):
+    push(redis_client, {"id": "a"}, {"id": "b"})
+    dead = make_client(redis_client, worker_id="dead")
+    live = make_client(redis_client, worker_id="live")
+    dead.dequeue()
+    live.dequeue()
+
+    redis_client.delete(dead.heartbeat_key)
+
+    assert live.reclaim_expired() == 1
+    assert [json.loads(raw)["id"] for raw in redis_client.lrange("processing", 0, -1)] == ["a"]
+    assert redis_client.llen(live.processing_key) == 1
+
+
+def test_reclaim_skips_live_workers(redis_client):
+    push(redis_client, {"id": "a"})
+    other = make_client(redis_client, worker_id="other")
+    other.dequeue()
+
+    assert make_client(redis_client, worker_id="me").reclaim_expired() == 0
+    assert redis_client.llen(other.processing_key) == 1
+
+
+def test_maybe_reclaim_is_rate_limited(redis_client):
+    client = make_client(redis_client, reclaim_interval=60)
+    calls = []
+    client.reclaim_expired = lambda: calls.append(time.monotonic()) or 0
+
+    client.maybe_reclaim()
+    client.maybe_reclaim()
+
+    assert len(calls) == 1
+
+
+def test_malformed_job_is_discarded(redis_client):
+    redis_client.rpush("processing", b"not json")
+    client = make_client(redis_client)
+
+    assert client.dequeue() == []
+    assert redis_client.llen(client.processing_key) == 0
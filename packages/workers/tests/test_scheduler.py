@@ -0,0 +1,175 @@
+import json
+
+import fakeredis
+import pytest
+
+from src import scheduler as scheduler_module
+from src.job_fusion import claim_sibling_jobs
+from src.queue_client import QueueClient
+from src.scheduler import (
+    AUDIO_BYTES_PER_SAMPLE,
+    AUDIO_SAMPLES_PER_SECOND,
+    BASE_JOB_MEMORY,
+    DEFAULT_SAMPLE_RATE,
+    MAX_BYPASS_SECONDS,
+    VIDEO_FRAMES_IN_FLIGHT,
+    VIDEO_PIXELS_PER_SECOND,
+    JobCost,
+    JobScheduler,
+    estimate_cost,
+)
+
+
+def fixed_cost(job):
+    return JobCost(1.0, 100)
+
+
+def test_identical_jobs_release_their_memory():
+    scheduler = JobScheduler(memory_budget=1000, cost_fn=fixed_cost)
+    payload = {"id": "same", "type": "generate_scene", "projectId": "p"}
+    for job in (dict(payload), dict(payload)):
+        scheduler.submit(job)
+
+    started = [scheduler.next(), scheduler.next()]
+    assert scheduler.running == 2
+    for job in started:
+        scheduler.complete(job)
+
+    assert scheduler.running == 0
+    assert scheduler._memory_in_use == 0
+    assert scheduler.stats()["generate_scene"]["completed"] == 2
+
+
+def test_memory_budget_limits_admission():
+    scheduler = JobScheduler(memory_budget=150, cost_fn=fixed_cost)
+    for i in range(2):
+        scheduler.submit({"id": str(i), "type": "quality_check"})
+
+    first = scheduler.next()
+    assert scheduler.next() is None
+    scheduler.complete(first)
+    assert scheduler.next() is not None
+
+
+def test_siblings_claimed_from_queue_are_reported():
+    redis_client = fakeredis.FakeRedis()
+    queue_client = QueueClient("processing", client=redis_client, worker_id="w1", block_timeout=1)
+    for job_type in ("analyze_audio", "vocal_extraction", "forced_alignment"):
+        redis_client.rpush("processing", json.dumps({"type": job_type, "projectId": "p", "sceneId": "s"}))
+
+    scheduler = JobScheduler(cost_fn=fixed_cost)
+    scheduler.submit(queue_client.dequeue()[0])
+    job = scheduler.next()
+    siblings = claim_sibling_jobs(queue_client, job, scheduler)
+    scheduler.complete(job, siblings)
+
+    completed = {job_type: stats["completed"] for job_type, stats in scheduler.stats().items()}
+    assert completed == {"analyze_audio": 1, "forced_alignment": 1, "vocal_extraction": 1}
+
+
+def test_weighted_fair_share_across_types():
+    scheduler = JobScheduler(cost_fn=fixed_cost)
+    for i in range(10):
+        scheduler.submit({"id": f"lip{i}", "type": "lip_sync_post_process"})
+    for i in range(10):
+        scheduler.submit({"id": f"audio{i}", "type": "analyze_audio"})
+
+    order = []
+    for _ in range(10):
+        job = scheduler.next()
+        order.append(job["type"])
+        scheduler.complete(job)
+
+    # analyze_audio has 8x the weight, so it gets 8 of every 9 slots
+    assert order.index("analyze_audio") == 1
+    assert order[:9].count("analyze_audio") == 8
+
+
+def test_short_job_is_not_stuck_behind_video_backlog():
+    scheduler = JobScheduler()
+    for i in range(6):
+        scheduler.submit({"id": f"lip{i}", "type": "lip_sync_post_process", "data": {"duration": 30}})
+    scheduler.submit({"id": "storyboard", "type": "generate_scenes"})
+
+    first = scheduler.next()
+    scheduler.complete(first)
+
+    assert scheduler.next()["id"] == "storyboard"
+
+
+def test_priority_order_within_a_type():
+    scheduler = JobScheduler(cost_fn=fixed_cost)
+    scheduler.submit({"id": "none", "type": "quality_check"})
+    scheduler.submit({"id": "five", "type": "quality_check", "priority": 5})
+    scheduler.submit({"id": "one", "type": "quality_check", "data": {"priority": 1}})
+    scheduler.submit({"id": "two", "type": "quality_check", "payload": {"priority": 2}})
+
+    order = []
+    while len(scheduler):
+        job = scheduler.next()
+        order.append(job["id"])
+        scheduler.complete(job)
+
+    assert order == ["one", "two", "five", "none"]
+
+
+def test_estimate_cost_audio_scales_with_samples():
+    cost = estimate_cost({"type": "analyze_audio", "data": {"duration": 60, "sampleRate": 44100}})
+
+    samples = 60 * 44100
+    assert cost.seconds == pytest.approx(samples / AUDIO_SAMPLES_PER_SECOND)
+    assert cost.memory_bytes == BASE_JOB_MEMORY + samples * AUDIO_BYTES_PER_SAMPLE
+
+    segment = estimate_cost({"type": "vocal_extraction", "payload": {"startTime": 10, "endTime": 40}})
+    assert segment.seconds == pytest.approx(30 * DEFAULT_SAMPLE_RATE / AUDIO_SAMPLES_PER_SECOND)
+
+
+def test_estimate_cost_video_scales_with_frames_and_resolution():
+    small = estimate_cost({"type": "quality_check", "data": {"frames": 240, "width": 640, "height": 360}})
+    large = estimate_cost({"type": "quality_check", "data": {"frames": 240, "width": 1280, "height": 720}})
+    longer = estimate_cost({"type": "quality_check", "data": {"duration": 20, "fps": 24, "width": 640, "height": 360}})
+
+    assert small.seconds == pytest.approx(240 * 640 * 360 / VIDEO_PIXELS_PER_SECOND)
+    assert large.seconds == pytest.approx(4 * small.seconds)
+    assert longer.seconds == pytest.approx(2 * small.seconds)
+    assert large.memory_bytes == BASE_JOB_MEMORY + 1280 * 720 * 3 * VIDEO_FRAMES_IN_FLIGHT
+
+
+def test_estimate_cost_other_jobs_are_small():
+    cost = estimate_cost({"type": "generate_scenes"})
+    assert (cost.seconds, cost.memory_bytes) == (1.0, BASE_JOB_MEMORY)
+
+
+def test_job_bigger_than_memory_left_is_bypassed_then_not_starved(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scheduler_module.time, "time", lambda: now[0])
+    scheduler = JobScheduler(memory_budget=1000, cost_fn=lambda job: JobCost(1.0, job["mem"]))
+
+    scheduler.submit({"id": "small1", "type": "quality_check", "mem": 100})
+    running = [scheduler.next()]
+    scheduler.submit({"id": "big", "type": "lip_sync_post_process", "mem": 950})
+    scheduler.submit({"id": "small2", "type": "quality_check", "mem": 100})
+
+    # big does not fit next to small1, so small2 goes around it
+    running.append(scheduler.next())
+    assert running[-1]["id"] == "small2"
+
+    # After MAX_BYPASS_SECONDS nothing else is admitted until big fits
+    now[0] += MAX_BYPASS_SECONDS + 1
+    scheduler.submit({"id": "small3", "type": "quality_check", "mem": 100})
+    assert scheduler.next() is None
+
+    for job in running:
+        scheduler.complete(job)
+    assert scheduler.next()["id"] == "big"
+
+
+def test_metric_samples_name_percentiles():
+    scheduler = JobScheduler(cost_fn=fixed_cost)
+    scheduler.submit({"id": "a", "type": "quality_check"})
+    scheduler.complete(scheduler.next())
+
+    names = {(name, metric_type) for name, metric_type, _, labels, _ in scheduler.metric_samples()}
+    assert ("worker_queue_wait_p95_seconds", "gauge") in names
+    assert ("worker_job_latency_p50_seconds", "gauge") in names
+    assert all("quantile" not in labels for _, _, _, labels, _ in scheduler.metric_samples())
@@ -0,0 +1,81 @@
+import json
+
+import fakeredis
+import pytest
+
+from src import worker
+from src.prefetch import InputPrefetcher
+from src.queue_client import RESULT_KEY_PREFIX, QueueClient
+from src.scheduler import JobScheduler
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def queue_client(redis_client):
+    return QueueClient("processing", client=redis_client, worker_id="w1", block_timeout=1)
+
+
+@pytest.fixture
+def prefetcher(tmp_path):
+    prefetcher = InputPrefetcher(work_dir=str(tmp_path))
+    yield prefetcher
+    prefetcher.close()
+
+
+class FailingProcessor(worker.JobProcessor):
+    def process(self, job_data):
+        raise RuntimeError("boom")
+
+
+def dequeue(redis_client, queue_client, job):
+    redis_client.rpush("processing", json.dumps(job))
+    return queue_client.dequeue()[0]
+
+
+def test_processing_failure_is_acked(redis_client, queue_client, prefetcher, monkeypatch):
+    monkeypatch.setitem(worker._processors, "quality_check", FailingProcessor)
+    job = dequeue(redis_client, queue_client, {"id": "a", "type": "quality_check"})
+    scheduler = JobScheduler()
+    scheduler.submit(job)
+
+    worker.run_scheduled_job(scheduler.next(), queue_client, prefetcher, scheduler)
+
+    result = json.loads(redis_client.get(f"{RESULT_KEY_PREFIX}a"))
+    assert result["success"] is False
+    assert "boom" in result["error"]
+    assert redis_client.llen(queue_client.processing_key) == 0
+    assert scheduler.running == 0
+
+
+def test_fused_run_error_acks_whole_group(redis_client, queue_client, prefetcher, monkeypatch):
+    def broken(jobs):
+        raise RuntimeError("fusion broke")
+
+    monkeypatch.setattr(worker, "run_fused_jobs", broken)
+    job = dequeue(redis_client, queue_client, {"id": "a", "type": "analyze_audio", "projectId": "p"})
+    redis_client.rpush("processing", json.dumps({"id": "b", "type": "vocal_extraction", "projectId": "p"}))
+    scheduler = JobScheduler()
+
+    siblings = worker.handle_job(job, queue_client, prefetcher, scheduler)
+
+    assert [sibling["id"] for sibling in siblings] == ["b"]
+    for job_id in ("a", "b"):
+        assert json.loads(redis_client.get(f"{RESULT_KEY_PREFIX}{job_id}"))["error"] == "fusion broke"
+    assert redis_client.llen(queue_client.processing_key) == 0
+
+
+def test_unpublishable_result_is_requeued(redis_client, queue_client, prefetcher, monkeypatch):
+    job = dequeue(redis_client, queue_client, {"id": "a", "type": "unknown_type"})
+
+    def broken_ack(results):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(queue_client, "ack_many", broken_ack)
+    worker.handle_job(job, queue_client, prefetcher, JobScheduler())
+
+    assert redis_client.llen(queue_client.processing_key) == 0
+    assert [json.loads(raw)["id"] for raw in redis_client.lrange("processing", 0, -1)] == ["a"]